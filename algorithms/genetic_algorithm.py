@@ -1,9 +1,29 @@
-from typing import List, Tuple
-import random
-import pandas as pd
-
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import repeat, zip_longest
+
+import numpy as np
+
+from algorithms.local_search import main_run_budget, polish_result
+from helpers.budget import as_budget
+from helpers.fitness_cache import FitnessCache
+from helpers.real_operators import PolynomialMutation, SimulatedBinaryCrossover
+from helpers.selection import TournamentSelection
+from helpers.shared_instance import shared_tsp_instance
+from helpers.tsp_crossover import OrderCrossover
 from helpers.tsp_functions import TSPFunctions
 from helpers.rastrigin_functions import RastriginFunctions
+from helpers.trace_recorder import TraceRecorder
+
+
+# Runs one epoch of an island in a worker process.
+# The island random stream is sent back, to continue it in the next epoch,
+# with the stats of the budget (a copy in the worker process).
+def evolve_island(genetic_algorithm, tsp, population, costs, budget, rng, generations):
+    population, costs, best_costs, _ = genetic_algorithm.evolve_tsp(
+        tsp, population, costs, budget, rng, generations=generations
+    )
+    return population, costs, best_costs, budget.stats(), rng
 
 
 class GeneticAlgorithm:
@@ -13,228 +33,414 @@ class GeneticAlgorithm:
         self.population_size_tsp = 200
         self.elite_percentage = 0.2
         self.mutation_prob = 0.2
+        # parent selection strategy (see helpers.selection)
+        self.selection = TournamentSelection(k=2)
+        # crossover operator of the TSP (see helpers.tsp_crossover)
+        self.crossover_tsp = OrderCrossover()
+        # size of the TSP fitness cache (see FitnessCache), None disables it.
+        # The counters of the last run are kept in fitness_cache_stats.
+        self.fitness_cache_size = None
+        self.fitness_cache_stats = None
+        # a run stops after this many generations in a row that were all
+        # found in the cache: they use no calls, so the budget does not end
+        # the run
+        self.max_cached_generations = 100
+        # island model (see _tsp_island_model), islands = 1 disables it
+        self.islands = 1
+        self.island_jobs = None
+        self.migration_interval = 10
+        self.migration_topology = "ring"
+        self.migrants = 2
+        # local search that polishes the best individual (for example
+        # LocalSearch()), None: no polishing
+        self.polishing = None
+        self.polishing_share = 0.1
+        # real-coded GA of the continuous problems (see
+        # rastrigin_genetic_algorithm and helpers/real_operators.py)
         self.population_size_rastrigin = 20
-        self.generations_rastrigin = 50
-
-    def tsp_genetic_algorithm(self, tsp, max_objective_calls):
-        population = self._generate_initial_population_tsp(tsp)
-        elite_count = int(self.population_size_tsp * self.elite_percentage)
-        # If odd, increment by 1 to make even
-        if elite_count % 2 != 0:
-            elite_count += 1
-
-        objective_calls = 0
-        iteration_list = []
-        best_distances = []
-
-        while objective_calls < max_objective_calls:
-            cost_tuples = self._generate_cost_tuples_tsp(tsp, population)
-
-            objective_calls += self.population_size_tsp
-
-            # Keep best individuals (elitism)
-            sorted_cost_tuples = sorted(cost_tuples, key=lambda x: x[0])
-            elites = sorted_cost_tuples[:elite_count]
-
-            new_population = []
-            for _ in range(self.population_size_tsp // 2 - elite_count // 2):
-                parent_1 = self._tournament_selection_tsp(cost_tuples)
-                remaining_cost_tuple = [ct for ct in cost_tuples if ct[1] != parent_1]
-                parent_2 = self._tournament_selection_tsp(remaining_cost_tuple)
-
-                child_1, child_2 = self._order_crossover_tsp(parent_1, parent_2)
-
-                child_1 = self._mutation_tsp(child_1)
-                child_2 = self._mutation_tsp(child_2)
+        self.crossover_real = SimulatedBinaryCrossover()
+        self.mutation_real = PolynomialMutation()
+        # trace of the best cost of each generation (see TraceRecorder)
+        self.trace_options = {"max_points": 2000}
+        # Budget.stats() of the last run, with the islands and the polishing,
+        # and of the child budget of every island and epoch, in order
+        self.budget_stats = None
+        self.island_budget_stats = None
+
+    # The population is a (pop_size x n) int32 matrix (one solution per row,
+    # see TSPFunctions.random_population): the whole generation is evaluated
+    # with a single gather over the distances, and the elites and the
+    # selected parents are row indices into the matrix.
+    #
+    # With islands > 1 the island model is used instead (see
+    # _tsp_island_model), with the same results format, when the budget
+    # allows two individuals per island. With a call cap smaller than the
+    # population, the population is made smaller. With a polishing
+    # local search, polishing_share of the budget is kept to improve the
+    # best individual at the end.
+    #
+    # rng and max_objective_calls as in HillClimbing.tsp_hill_climbing
+    def tsp_genetic_algorithm(self, tsp, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+
+        main_budget = main_run_budget(budget, self.polishing, self.polishing_share)
+        self.island_budget_stats = []
+
+        if self.islands > 1 and self._population_size_tsp(main_budget) >= 2:
+            result = self._tsp_island_model(tsp, main_budget, rng)
+        else:
+            result = self._tsp_single_population(tsp, main_budget, rng)
+        result = polish_result(tsp, result, budget, main_budget, self.polishing)
+
+        self.budget_stats = budget.stats()
+        return result
+
+    def _tsp_single_population(self, tsp, budget, rng):
+        cache = None
+        if self.fitness_cache_size is not None:
+            cache = FitnessCache(self.fitness_cache_size)
+
+        population = self.tsp_functions.random_population(
+            tsp, self._population_size_tsp(budget, 1), rng
+        )
+        costs, objective_calls = self._evaluate_tsp(tsp, population, cache)
+        budget.charge(objective_calls)
 
-                new_population.append(child_1)
-                new_population.append(child_2)
+        population, costs, best_costs, _ = self.evolve_tsp(
+            tsp, population, costs, budget, rng, cache=cache
+        )
 
-            # Add elites directly to new population
-            new_population += [elite[1] for elite in elites]
+        if cache is not None:
+            self.fitness_cache_stats = cache.stats()
 
-            population = new_population
-            best_cost, best_solution = min(cost_tuples, key=lambda x: x[0])
-            iteration_list.append(len(iteration_list))
-            best_distances += [best_cost]
+        trace = TraceRecorder(**self.trace_options)
+        for generation, best_cost in enumerate(best_costs):
+            trace.record(generation, best_cost, best_cost)
 
+        best = np.argmin(costs)
+        iteration_list, _, best_distances = trace.result()
         return (
-            best_cost,
-            best_solution,
+            float(costs[best]),
+            population[best].tolist(),
             iteration_list,
             best_distances,
             best_distances,
         )
 
-    def _order_crossover_tsp(
-        self, parent_1: List[int], parent_2: List[int]
-    ) -> tuple[List[int], List[int]]:
-        size = len(parent_1)
-
-        # Step 1: Choose two random crossover points
-        start, end = sorted(random.sample(range(size), 2))
-
-        # Step 2: Create the first child
-        child_1 = [None] * size
-        # Copy the segment from parent_1
-        child_1[start : end + 1] = parent_1[start : end + 1]
-
-        # Fill the remaining positions with the order from parent_2
-        current_pos = (end + 1) % size
-        for city in parent_2:
-            if city not in child_1:
-                child_1[current_pos] = city
-                current_pos = (current_pos + 1) % size
-
-        # Step 3: Create the second child
-        child_2 = [None] * size
-        # Copy the segment from parent_2
-        child_2[start : end + 1] = parent_2[start : end + 1]
-
-        # Fill the remaining positions with the order from parent_1
-        current_pos = (end + 1) % size
-        for city in parent_1:
-            if city not in child_2:
-                child_2[current_pos] = city
-                current_pos = (current_pos + 1) % size
-
-        return child_1, child_2
-
-    def _tournament_selection_tsp(
-        self, cost_tuple: List[Tuple[float, List[int]]]
-    ) -> List[int]:
-        # Select first candidate
-        candidate_1 = random.choice(cost_tuple)
-        # Select second candidate ensuring it's different
-        remaining_population = [ct for ct in cost_tuple if ct != candidate_1]
-        candidate_2 = random.choice(remaining_population)
-
-        # Extract distances
-        distance_1, route_1 = candidate_1
-        distance_2, route_2 = candidate_2
-
-        # Select candidate with shortest route
-        winner = route_1 if distance_1 <= distance_2 else route_2
-
-        return winner
-
-    def _mutation_tsp(self, solution: List[int]) -> List[int]:
-        if random.random() < self.mutation_prob:
-            return self.tsp_functions.generate_neighbor(solution)
-
-        return solution
-
-    def _generate_initial_population_tsp(self, tsp: pd.DataFrame) -> List[List[int]]:
-        population = []
-        for _ in range(self.population_size_tsp):
-            individual = self.tsp_functions.random_solution(tsp)
-            population.append(individual)
-
-        return population
-
-    def _generate_cost_tuples_tsp(
-        self, tsp: pd.DataFrame, population: List[List[int]]
-    ) -> List[Tuple[float, List[int]]]:
-        cost_tuples = []
-        for individual in population:
-            cost = self.tsp_functions.calculate_cost(tsp, individual)
-            cost_tuples.append((cost, individual))
-
-        return cost_tuples
-
-    def rastrigin_genetic_algorithm(self, _):
-        population = self._generate_initial_population_rastrigin()
-
-        elite_count = int(self.population_size_rastrigin * self.elite_percentage)
-        # If odd, increment by 1 to make even
-        if elite_count % 2 != 0:
-            elite_count += 1
-
-        iteration_list = []
-        best_costs = []
-
-        for _ in range(self.generations_rastrigin):
-            cost_tuples = self._generate_cost_tuples_rastrigin(population)
+    # Individuals of each of `populations` initial populations (default:
+    # one per island) within the call cap, at least one
+    def _population_size_tsp(self, budget, populations=None):
+        remaining = budget.remaining()
+        if remaining is None:
+            return self.population_size_tsp
+        populations = populations or self.islands
+        return max(min(self.population_size_tsp, remaining // populations), 1)
+
+    # Evolve an evaluated population for up to `generations` generations,
+    # until the budget is exhausted. Returns the last population, its
+    # costs, the best cost of each generation (the given population first)
+    # and the objective calls used.
+    def evolve_tsp(
+        self,
+        tsp,
+        population,
+        costs,
+        budget,
+        rng,
+        generations=None,
+        cache=None,
+    ):
+        best_costs = [float(np.min(costs))]
+        objective_calls = 0
+        generation = 0
+        # generations in a row that evaluated no new tour
+        cached_generations = 0
+
+        while not budget.exhausted() and (
+            generations is None or generation < generations
+        ):
+            if cached_generations >= self.max_cached_generations:
+                break
+            next_population = self._next_generation_tsp(population, costs, rng)
+            population, costs, calls = self._evaluate_generation(
+                tsp, next_population, population, costs, budget, cache
+            )
+            objective_calls += calls
+            cached_generations = cached_generations + 1 if calls == 0 else 0
+            best_costs.append(float(np.min(costs)))
+            generation += 1
+
+        return population, costs, best_costs, objective_calls
+
+    # Evaluates a new generation within the budget. Returns the population
+    # (the new individuals the budget allowed, in order, and the best of
+    # the previous generation in the rest), its costs and the calls used.
+    # The cache is not used when fewer calls than individuals are left: its
+    # calls are only known after the evaluation.
+    def _evaluate_generation(
+        self, tsp, population, previous, previous_costs, budget, cache
+    ):
+        remaining = budget.remaining()
+        if cache is not None and (remaining is None or remaining >= len(population)):
+            costs, calls = self._evaluate_tsp(tsp, population, cache)
+            budget.charge(calls)
+            return population, costs, calls
+
+        granted = budget.take(len(population))
+        costs = self.tsp_functions.calculate_costs(tsp, population[:granted])
+        if granted < len(population):
+            kept = len(population) - granted
+            best = np.argpartition(previous_costs, kept - 1)[:kept]
+            population = np.concatenate([population[:granted], previous[best]])
+            costs = np.concatenate([costs, previous_costs[best]])
+        return population, costs, granted
+
+    # Costs of the population and the objective calls used
+    def _evaluate_tsp(self, tsp, population, cache=None):
+        if cache is None:
+            return self.tsp_functions.calculate_costs(tsp, population), len(population)
+
+        # only tours not seen before are evaluated (and counted), see
+        # max_cached_generations
+        return cache.evaluate(
+            self.tsp_functions.canonical_tours(population),
+            lambda tours: self.tsp_functions.calculate_costs(tsp, tours),
+        )
 
-            # Keep best individuals (elitism)
-            sorted_cost_tuples = sorted(cost_tuples, key=lambda x: x[0])
-            elites = sorted_cost_tuples[:elite_count]
+    # Selection, crossover and mutation, plus the elites
+    def _next_generation_tsp(self, population, costs, rng):
+        elite_count = self._elite_count(len(population))
+        pair_count = len(population) // 2 - elite_count // 2
 
-            new_population = []
-            for _ in range(self.population_size_rastrigin // 2 - elite_count // 2):
-                parent_1 = self._tournament_selection_rastrigin(cost_tuples)
-                remaining_cost_tuple = [ct for ct in cost_tuples if ct[1] != parent_1]
-                parent_2 = self._tournament_selection_rastrigin(remaining_cost_tuple)
+        # Keep best individuals (elitism), without sorting the population
+        elites = np.argpartition(costs, elite_count - 1)[:elite_count]
 
-                child_1, child_2 = self._crossover_rastrigin(parent_1, parent_2)
+        # two different parents for each pair of children
+        parents_1, parents_2 = self.selection.select_pairs(costs, pair_count, rng)
 
-                child_1 = self._mutation_rastrigin(child_1)
-                child_2 = self._mutation_rastrigin(child_2)
+        # all the children of the generation at once
+        children_1, children_2 = self.crossover_tsp.crossover(
+            population[parents_1], population[parents_2], rng
+        )
+        children = np.concatenate([children_1, children_2])
 
-                new_population.append(child_1)
-                new_population.append(child_2)
+        self._mutation_tsp(children, rng)
 
-            # Add elites directly to new population
-            new_population += [elite[1] for elite in elites]
+        # Add elites directly to new population
+        return np.concatenate([children, population[elites]])
 
-            population = new_population
-            best_cost, best_solution = min(cost_tuples, key=lambda x: x[0])
-            iteration_list.append(len(iteration_list))
-            best_costs += [best_cost]
+    def _elite_count(self, population_size):
+        elite_count = int(population_size * self.elite_percentage)
+        # If odd, increment by 1 to make even
+        if elite_count % 2 != 0:
+            elite_count += 1
+        return elite_count
+
+    # Island model: `islands` populations of population_size_tsp individuals
+    # evolve in parallel, each one in a worker process (island_jobs, None:
+    # one per island) that maps the shared distance matrix, or one after
+    # the other in this process with island_jobs = 1. Every
+    # migration_interval generations the best `migrants` of each island
+    # replace the worst individuals of another one: the next island
+    # ("ring" topology) or a random one ("random").
+    #
+    # The budget is shared by all the islands (smaller ones under a small
+    # call cap, see _population_size_tsp): each epoch every island gets
+    # a child budget with its share of the calls left (see Budget.child).
+    # Each island has its own random stream (spawned from rng), so with a
+    # call cap the results do not depend on the number of processes. The
+    # fitness cache is not used here.
+    def _tsp_island_model(self, tsp, budget, rng):
+        island_rngs = rng.spawn(self.islands)
+        population_size = self._population_size_tsp(budget)
+        populations = [
+            self.tsp_functions.random_population(tsp, population_size, island_rng)
+            for island_rng in island_rngs
+        ]
+        island_costs = [
+            self.tsp_functions.calculate_costs(tsp, population)
+            for population in populations
+        ]
+        budget.charge(self.islands * population_size)
+
+        trace = TraceRecorder(**self.trace_options)
+        best_cost = min(float(np.min(costs)) for costs in island_costs)
+        trace.record(0, best_cost, best_cost)
+        generation = 1
+
+        with ExitStack() as stack:
+            map_islands = map
+            if self.island_jobs != 1:
+                tsp = stack.enter_context(shared_tsp_instance(tsp))
+                executor = ProcessPoolExecutor(
+                    max_workers=self.island_jobs or self.islands
+                )
+                map_islands = stack.enter_context(executor).map
+
+            while not budget.exhausted():
+                # the calls left are split between the islands,
+                # the remainder goes to the first ones
+                remaining_calls = budget.remaining()
+                island_budgets = []
+                for island in range(self.islands):
+                    island_calls = None
+                    if remaining_calls is not None:
+                        island_calls = remaining_calls // self.islands + int(
+                            island < remaining_calls % self.islands
+                        )
+                    island_budgets.append(budget.child(island_calls))
+                evolved = map_islands(
+                    evolve_island,
+                    repeat(self),
+                    repeat(tsp),
+                    populations,
+                    island_costs,
+                    island_budgets,
+                    island_rngs,
+                    repeat(self.migration_interval),
+                )
+
+                epoch_best_costs = []
+                for island, island_result in enumerate(list(evolved)):
+                    (
+                        populations[island],
+                        island_costs[island],
+                        best_costs,
+                        island_stats,
+                        island_rngs[island],
+                    ) = island_result
+                    self.island_budget_stats.append(island_stats)
+                    budget.charge(island_stats["objective_calls"])
+                    # the first one is the best cost before the epoch
+                    epoch_best_costs.append(best_costs[1:])
+
+                # best cost of each generation over all the islands
+                for generation_costs in zip_longest(
+                    *epoch_best_costs, fillvalue=float("inf")
+                ):
+                    best_cost = min(best_cost, *generation_costs)
+                    trace.record(generation, best_cost, best_cost)
+                    generation += 1
+
+                self._migrate(populations, island_costs, rng)
+
+        best_island = min(
+            range(self.islands), key=lambda island: np.min(island_costs[island])
+        )
+        best = np.argmin(island_costs[best_island])
+        iteration_list, _, best_distances = trace.result()
+        return (
+            float(island_costs[best_island][best]),
+            populations[best_island][best].tolist(),
+            iteration_list,
+            best_distances,
+            best_distances,
+        )
 
+    # The best `migrants` of each island replace the worst ones of its
+    # destination island (in place). All the emigrants are chosen before
+    # any island is changed.
+    def _migrate(self, populations, island_costs, rng):
+        count = min(self.migrants, len(populations[0]))
+        islands = len(populations)
+
+        if self.migration_topology == "ring":
+            destinations = (np.arange(islands) + 1) % islands
+        elif self.migration_topology == "random":
+            destinations = (
+                np.arange(islands) + rng.integers(1, islands, islands)
+            ) % islands
+        else:
+            raise ValueError(f"Unknown migration topology: {self.migration_topology}")
+
+        emigrants = []
+        for population, costs in zip(populations, island_costs):
+            best = np.argpartition(costs, count - 1)[:count]
+            emigrants.append((population[best], costs[best]))
+
+        for source, destination in enumerate(destinations):
+            costs = island_costs[destination]
+            worst = np.argpartition(costs, len(costs) - count)[len(costs) - count :]
+            populations[destination][worst], costs[worst] = emigrants[source]
+
+    # Each child (row) is mutated with probability mutation_prob,
+    # by swapping two of its cities (in place)
+    def _mutation_tsp(self, children: np.ndarray, rng: np.random.Generator):
+        rows = np.flatnonzero(rng.random(len(children)) < self.mutation_prob)
+        self.tsp_functions.swap_rows(children, rows, rng)
+
+    # Real-coded GA for the continuous problems (see ContinuousFunctions).
+    # The population is a (population_size_rastrigin x dimensions) matrix:
+    # selection, crossover (crossover_real) and mutation (mutation_real,
+    # see helpers/real_operators.py) work on all the individuals at once.
+    #
+    # Every evaluated individual is one objective call and a call cap is
+    # used exactly: the last generation makes only the children the budget
+    # allows, and the best individuals of the previous one fill the rest of
+    # the population.
+    def rastrigin_genetic_algorithm(self, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        problem = self.rastrigin_functions
+
+        population_size = self.population_size_rastrigin
+        if budget.remaining() is not None:
+            population_size = max(min(population_size, budget.remaining()), 1)
+        population = problem.random_population(population_size, rng)
+        costs = problem.calculate_costs(population)
+        budget.charge(len(population))
+
+        trace = TraceRecorder(**self.trace_options)
+        generation = 0
+        best_cost = float(np.min(costs))
+        trace.record(generation, best_cost, best_cost)
+
+        while not budget.exhausted():
+            children = self._next_children_rastrigin(
+                population, costs, budget.remaining(), rng
+            )
+            # the deadline may pass before the children are evaluated
+            children_costs = budget.evaluate(problem.calculate_costs, children)
+            children = children[: len(children_costs)]
+
+            # Keep the best individuals (elitism) in the remaining places
+            survivors = len(population) - len(children)
+            elites = np.argpartition(costs, survivors - 1)[:survivors]
+            population = np.concatenate([children, population[elites]])
+            costs = np.concatenate([children_costs, costs[elites]])
+
+            generation += 1
+            best_cost = float(np.min(costs))
+            trace.record(generation, best_cost, best_cost)
+
+        self.budget_stats = budget.stats()
+        best = np.argmin(costs)
+        iteration_list, _, best_costs = trace.result()
         return (
-            best_cost,
-            best_solution,
+            float(costs[best]),
+            population[best],
             iteration_list,
             best_costs,
             best_costs,
         )
 
-    def _generate_initial_population_rastrigin(self):
-        population = []
-        for _ in range(self.population_size_rastrigin):
-            individual = self.rastrigin_functions.random_solution()
-            population.append(individual)
-
-        return population
-
-    def _generate_cost_tuples_rastrigin(self, population):
-        cost_tuples = []
-        for individual in population:
-            cost = self.rastrigin_functions.calculate_cost(individual)
-            cost_tuples.append((cost, individual))
-
-        return cost_tuples
-
-    def _tournament_selection_rastrigin(self, cost_tuple):
-        candidate_1 = random.choice(cost_tuple)
-        remaining_population = [ct for ct in cost_tuple if ct != candidate_1]
-        candidate_2 = random.choice(remaining_population)
-
-        cost_1, solution_1 = candidate_1
-        cost_2, solution_2 = candidate_2
-
-        winner = solution_1 if cost_1 <= cost_2 else solution_2
-
-        return winner
-
-    def _mutation_rastrigin(self, solution):
-        if random.random() < self.mutation_prob:
-            return self.rastrigin_functions.generate_neighbor(solution)
-
-        return solution
-
-    def _crossover_rastrigin(self, parent1, parent2):
-        # Generate alpha from a uniform distribution between 0 and 1
-        alpha = random.uniform(0, 1)
-
-        # Perform weighted average crossover for each coordinate
-        child1_x = parent1[0] * alpha + parent2[0] * (1 - alpha)
-        child1_y = parent1[1] * alpha + parent2[1] * (1 - alpha)
-        child2_x = parent2[0] * alpha + parent1[0] * (1 - alpha)
-        child2_y = parent2[1] * alpha + parent1[1] * (1 - alpha)
-
-        child1 = (child1_x, child1_y)
-        child2 = (child2_x, child2_y)
+    # Children of a generation: all but the elites, at most max_children
+    # (None: no limit)
+    def _next_children_rastrigin(self, population, costs, max_children, rng):
+        elite_count = self._elite_count(len(population))
+        children_count = len(population) - elite_count
+        if max_children is not None:
+            children_count = min(children_count, max_children)
+        pair_count = -(-children_count // 2)
+
+        # two different parents for each pair of children
+        parents_1, parents_2 = self.selection.select_pairs(costs, pair_count, rng)
+        children_1, children_2 = self.crossover_real.crossover(
+            population[parents_1], population[parents_2], self.rastrigin_functions, rng
+        )
+        children = np.concatenate([children_1, children_2])
+        children = children[:children_count]
 
-        return child1, child2
+        self.mutation_real.mutate(children, self.rastrigin_functions, rng)
+        return children
@@ -1,5 +1,43 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import repeat
+
+import numpy as np
+
+from helpers.budget import as_budget
 from helpers.tsp_functions import TSPFunctions
 from helpers.rastrigin_functions import RastriginFunctions
+from helpers.shared_instance import shared_tsp_instance
+from helpers.trace_recorder import TraceRecorder
+
+
+# State of one hill climbing run (one restart), advanced by
+# HillClimbing._climb a slice of budget at a time
+class ClimbState:
+    def __init__(self, solution, rng, trace_options):
+        self.solution = solution
+        # None until the first step
+        self.cost = None
+        self.rng = rng
+        self.objective_calls = 0
+        self.iteration = 0
+        self.stagnant_iterations = 0
+        # rounds of HillClimbing._multi_start run so far
+        self.rounds = 0
+        self.trace = TraceRecorder(**trace_options)
+
+    # results in the format of the algorithms
+    def result(self):
+        iteration_list, _, best_costs = self.trace.result()
+        return self.cost, self.solution, iteration_list, best_costs, best_costs
+
+
+# Advances a restart in a worker process (see HillClimbing._multi_start).
+# The state, with its random stream, is sent back with the stats of the
+# budget (a copy in the worker process).
+def climb(hill_climbing, tsp, state, budget, stagnation_limit):
+    hill_climbing.climb(tsp, state, budget, stagnation_limit)
+    return state, budget.stats()
 
 
 class HillClimbing:
@@ -8,162 +46,376 @@ class HillClimbing:
         self.rastrigin_functions = RastriginFunctions()
         self.num_restarts_tsp = 5
         self.num_restarts_rastringin = 20
-
-    def tsp_hill_climbing(self, tsp, max_objective_calls):
-        initial_solution = self.tsp_functions.random_solution(tsp)
-
-        best_solution, best_cost, first_objective_calls = (
-            self.tsp_functions.get_best_neighbor(tsp, initial_solution)
+        # a restart is cancelled after this many iterations without
+        # improvement, and its unused budget given to the others
+        # (None: never). With the best-improvement TSP neighborhood an
+        # iteration without improvement means a local optimum was reached.
+        self.stagnation_limit_tsp = 1
+        self.stagnation_limit_rastrigin = 3
+        # a restart is also cancelled when, at the end of a round (see
+        # _multi_start), its cost is worse than the best cost of all the
+        # restarts after as many rounds by more than this share of it
+        # (None: never)
+        self.dominance_margin_tsp = 0.1
+        self.dominance_margin_rastrigin = 0.5
+        # rounds of the share of budget of each restart (see _multi_start)
+        self.sync_rounds = 4
+        # neighbors scored per iteration on the Rastrigin function
+        self.num_neighbors_rastrigin = 10
+        # worker processes for the restarts (None: all cores)
+        self.restart_jobs = 1
+        # trace of each restart, one point per iteration (see TraceRecorder)
+        self.trace_options = {"max_points": 2000}
+        # Budget.stats() of the last run, all the restarts together, and of
+        # the child budget of every round of every restart, in order
+        self.budget_stats = None
+        self.restart_budget_stats = None
+
+    # rng: NumPy Generator, seed or None (see np.random.default_rng)
+    # max_objective_calls: number of calls or Budget (see as_budget)
+    def tsp_hill_climbing(self, tsp, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        state = self.start(tsp, rng)
+        self.climb(tsp, state, budget)
+        self.budget_stats = budget.stats()
+
+        return state.result()
+
+    def tsp_hill_climbing_restart(self, tsp, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        return self._multi_start(
+            tsp,
+            self.num_restarts_tsp,
+            max_objective_calls,
+            self.stagnation_limit_tsp,
+            self.dominance_margin_tsp,
+            rng,
         )
 
-        iteration_list = []
-        best_distances = []
-
-        objective_calls = first_objective_calls
-        iteration = 0
-        while objective_calls < max_objective_calls:
-            new_candidate, new_cost, new_objective_calls = (
-                self.tsp_functions.get_best_neighbor(tsp, best_solution)
-            )
-
-            if new_cost < best_cost:
-                best_cost = new_cost
-                best_solution = new_candidate
-
-            iteration_list += [iteration]
-            best_distances += [best_cost]
-            iteration += 1
-
-            objective_calls += new_objective_calls
-
-        print("Iterations: ", iteration)
-        return (
-            best_cost,
-            best_solution,
-            iteration_list,
-            best_distances,
-            best_distances,
+    def rastrigin_hill_climbing(self, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        state = self.start(None, rng)
+        self.climb(None, state, budget)
+        self.budget_stats = budget.stats()
+
+        return state.result()
+
+    def rastrigin_hill_climbing_restart(self, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        return self._multi_start(
+            None,
+            self.num_restarts_rastringin,
+            max_objective_calls,
+            self.stagnation_limit_rastrigin,
+            self.dominance_margin_rastrigin,
+            rng,
         )
 
-    def tsp_hill_climbing_restart(self, tsp, max_objective_calls):
-        # Initialize best solution tracking variables
-        best_overall_cost = float("inf")
-        best_overall_solution = None
+    # New run from a random solution of the TSP or,
+    # with tsp=None, of the Rastrigin function
+    def start(self, tsp, rng):
+        if tsp is None:
+            solution = self.rastrigin_functions.random_solution(rng)
+        else:
+            solution = self.tsp_functions.random_solution(tsp, rng)
+        return ClimbState(solution, rng, self.trace_options)
+
+    # Move to the best neighbor while it improves the solution, until the
+    # budget is exhausted or the run did not improve for stagnation_limit
+    # iterations. Each iteration takes the calls of a whole neighborhood
+    # from the budget; when fewer are left, only that many neighbors are
+    # scored. Returns the state (changed in place).
+    def climb(self, tsp, state, budget, stagnation_limit=None):
+        if state.cost is None:
+            # the initial solution is always evaluated
+            state.cost = self._calculate_cost(tsp, state.solution)
+            budget.charge(1)
+            state.objective_calls += 1
+
+        neighborhood_size = self._neighborhood_size(tsp, state.solution)
+        while not budget.exhausted():
+            if (
+                stagnation_limit is not None
+                and state.stagnant_iterations >= stagnation_limit
+            ):
+                break
+
+            granted = budget.take(neighborhood_size)
+            if granted == 0:
+                break
+
+            new_candidate, new_cost = self._best_neighbor(
+                tsp, state.solution, state.rng, granted
+            )
 
-        max_attempt_objective_calls = max_objective_calls // self.num_restarts_tsp
+            if new_cost < state.cost:
+                state.cost = new_cost
+                state.solution = new_candidate
+                state.stagnant_iterations = 0
+            else:
+                state.stagnant_iterations += 1
 
-        iteration_list = []
-        best_distances = []
-        distance_list = []
-
-        # Perform multiple hill climbing attempts with different starting points
-        for _ in range(self.num_restarts_tsp):
-            (
-                current_cost,
-                current_solution,
-                attempt_iteration_list,
-                attempt_distance_list,
-                attempt_best_distances,
-            ) = self.tsp_hill_climbing(tsp, max_attempt_objective_calls)
-
-            for i in range(len(attempt_iteration_list)):
-                iteration_list += [len(iteration_list)]
-                if attempt_best_distances[i] < best_overall_cost:
-                    best_distances += [attempt_best_distances[i]]
-                else:
-                    best_distances += [best_overall_cost]
+            state.trace.record(state.iteration, state.cost, state.cost)
+            state.iteration += 1
 
-            # Update best solution if current solution is better
-            if current_cost < best_overall_cost:
-                best_overall_cost = current_cost
-                best_overall_solution = current_solution
+            state.objective_calls += granted
 
-            distance_list += attempt_distance_list
+        return state
 
-        return (
-            best_overall_cost,
-            best_overall_solution,
-            iteration_list,
-            distance_list,
-            best_distances,
-        )
+    def _calculate_cost(self, tsp, solution):
+        if tsp is None:
+            return self.rastrigin_functions.calculate_cost(solution)
+        return self.tsp_functions.calculate_cost(tsp, solution)
 
-    def rastrigin_hill_climbing(self, max_objective_calls):
-        initial_solution = self.rastrigin_functions.random_solution()
+    def _neighborhood_size(self, tsp, solution):
+        if tsp is None:
+            return self.num_neighbors_rastrigin
+        return self.tsp_functions.neighborhood_size(len(solution))
 
-        best_solution, best_cost, first_objective_calls = (
-            self.rastrigin_functions.get_best_neighbor(initial_solution)
+    # Best of the first num_neighbors neighbors (the cost of the solution
+    # itself when none improves it)
+    def _best_neighbor(self, tsp, solution, rng, num_neighbors):
+        if tsp is None:
+            neighbor, cost, _ = self.rastrigin_functions.get_best_neighbor(
+                solution, num_neighbors, rng=rng
+            )
+        else:
+            neighbor, cost, _ = self.tsp_functions.get_best_neighbor(
+                tsp, solution, max_moves=num_neighbors
+            )
+        return neighbor, cost
+
+    # Multi-start engine of the restart variants.
+    #
+    # Every restart gets the same share of the calls and its own random
+    # stream (spawned from rng), and the restarts run concurrently over
+    # restart_jobs worker processes (the TSP distances are shared, see
+    # shared_tsp_instance), each one with a child budget (see
+    # Budget.child). They run in sync_rounds rounds per share; after each
+    # round a restart that stagnated or is dominated is cancelled (see
+    # _cancelled_restarts), and its unused calls are given to the others or
+    # to new restarts (see _reassign_budget). With a deadline and no call
+    # cap each restart runs in a single round, until it stagnates, and new
+    # ones are started until the deadline.
+    #
+    # With a call cap the results do not depend on the number of processes.
+    # The traces of the restarts are merged in order (see _merge_restarts).
+    def _multi_start(
+        self,
+        tsp,
+        num_restarts,
+        max_objective_calls,
+        stagnation_limit,
+        dominance_margin,
+        rng,
+    ):
+        budget = as_budget(max_objective_calls)
+        capped = budget.remaining() is not None
+        if not capped and budget.deadline is None:
+            raise ValueError("The budget needs a call cap or a deadline")
+        if capped:
+            # every restart evaluates its initial solution
+            num_restarts = max(min(num_restarts, budget.remaining()), 1)
+
+        states = [
+            self.start(tsp, restart_rng) for restart_rng in rng.spawn(num_restarts)
+        ]
+        # calls of each restart and of each of its rounds (None: no cap),
+        # the rounds end between two neighborhoods
+        restart_budget = round_calls = None
+        budgets = [None] * num_restarts
+        if capped:
+            # the remainder goes to the first restarts
+            restart_budget, remainder = divmod(budget.remaining(), num_restarts)
+            budgets = [
+                restart_budget + int(restart < remainder)
+                for restart in range(num_restarts)
+            ]
+            neighborhood_size = self._neighborhood_size(tsp, states[0].solution)
+            round_calls = -(-restart_budget // self.sync_rounds)
+            round_calls = max(-(-round_calls // neighborhood_size), 1)
+            round_calls *= neighborhood_size
+        running = list(range(num_restarts))
+        # best cost of all the restarts after each round
+        round_best_costs = []
+        self.restart_budget_stats = []
+
+        with ExitStack() as stack:
+            map_restarts = map
+            if self.restart_jobs != 1:
+                if tsp is not None:
+                    tsp = stack.enter_context(shared_tsp_instance(tsp))
+                executor = ProcessPoolExecutor(max_workers=self.restart_jobs)
+                map_restarts = stack.enter_context(executor).map
+
+            # the first round also runs on an exhausted budget, to evaluate
+            # the initial solutions
+            while running:
+                children = [
+                    budget.child(
+                        None
+                        if budgets[restart] is None
+                        else min(
+                            budgets[restart] - states[restart].objective_calls,
+                            round_calls,
+                        )
+                    )
+                    for restart in running
+                ]
+                climbed = map_restarts(
+                    climb,
+                    repeat(self),
+                    repeat(tsp),
+                    [states[restart] for restart in running],
+                    children,
+                    repeat(stagnation_limit),
+                )
+                # the child budgets are copies in the worker processes, their
+                # calls are counted from the stats sent back
+                for restart, (state, stats) in zip(running, climbed):
+                    states[restart] = state
+                    self.restart_budget_stats.append(stats)
+                    budget.charge(stats["objective_calls"])
+
+                cancelled = self._cancelled_restarts(
+                    [states[restart] for restart in running],
+                    round_best_costs,
+                    stagnation_limit,
+                    dominance_margin,
+                )
+                cancelled = [
+                    restart for restart, cancel in zip(running, cancelled) if cancel
+                ]
+                running = [restart for restart in running if restart not in cancelled]
+                if budget.exhausted():
+                    break
+
+                running = self._reassign_budget(
+                    tsp, states, budgets, running, cancelled, restart_budget, rng
+                )
+
+        self.budget_stats = budget.stats()
+        # restarts created when the budget ran out were never started
+        return self._merge_restarts(
+            [state.result() for state in states if state.cost is not None]
         )
 
-        iteration_list = []
-        best_distances = []
-
-        objective_calls = first_objective_calls
-        iteration = 0
-        while objective_calls < max_objective_calls:
-            new_candidate, new_cost, new_objective_calls = (
-                self.rastrigin_functions.get_best_neighbor(best_solution)
+    # Ends a round of the restarts that ran it: whether each one is
+    # cancelled, because it stagnated or is dominated. The cost of a restart
+    # is compared with the best cost of all the restarts after as many
+    # rounds (round_best_costs, updated here), not with the best cost so
+    # far: a restart started later (see _reassign_budget) is not cancelled
+    # only because the others had more rounds to improve. It is dominated
+    # when it is worse than that cost by more than dominance_margin of it.
+    def _cancelled_restarts(
+        self, states, round_best_costs, stagnation_limit, dominance_margin
+    ):
+        for state in states:
+            state.rounds += 1
+            if state.rounds > len(round_best_costs):
+                round_best_costs.append(state.cost)
+            else:
+                round_best_costs[state.rounds - 1] = min(
+                    round_best_costs[state.rounds - 1], state.cost
+                )
+        return [
+            self._cancel_restart(
+                state,
+                round_best_costs[state.rounds - 1],
+                stagnation_limit,
+                dominance_margin,
             )
-
-            if new_cost < best_cost:
-                best_cost = new_cost
-                best_solution = new_candidate
-
-            iteration_list += [iteration]
-            best_distances += [best_cost]
-            iteration += 1
-
-            objective_calls += new_objective_calls
-
+            for state in states
+        ]
+
+    def _cancel_restart(self, state, best_cost, stagnation_limit, dominance_margin):
+        if (
+            stagnation_limit is not None
+            and state.stagnant_iterations >= stagnation_limit
+        ):
+            return True
         return (
-            best_cost,
-            best_solution,
-            iteration_list,
-            best_distances,
-            best_distances,
+            dominance_margin is not None
+            and state.cost > best_cost + dominance_margin * abs(best_cost)
         )
 
-    def rastrigin_hill_climbing_restart(self, max_objective_calls):
-        # Initialize best solution tracking variables
+    # Gives the unused calls of the cancelled restarts to the ones still
+    # running, split evenly (the remainder goes to the best ones), or, when
+    # every restart was cancelled, to new restarts of restart_budget calls
+    # (the remainder, or all the calls when there are fewer than a share,
+    # goes to the last one). Without a call cap (budgets of None) new
+    # restarts are only started when every restart was cancelled. Returns
+    # the restarts of the next round; states and budgets are changed in
+    # place.
+    def _reassign_budget(
+        self, tsp, states, budgets, running, cancelled, restart_budget, rng
+    ):
+        if restart_budget is None:
+            if not running:
+                for restart_rng in rng.spawn(len(cancelled)):
+                    running.append(len(states))
+                    states.append(self.start(tsp, restart_rng))
+                    budgets.append(None)
+            return running
+
+        unused_budget = sum(
+            budgets[restart] - states[restart].objective_calls
+            for restart in cancelled
+        )
+        if running:
+            extra_budget, remainder = divmod(unused_budget, len(running))
+            ranked = sorted(running, key=lambda restart: states[restart].cost)
+            for rank, restart in enumerate(ranked):
+                budgets[restart] += extra_budget + int(rank < remainder)
+            return [
+                restart
+                for restart in running
+                if states[restart].objective_calls < budgets[restart]
+            ]
+        if unused_budget > 0:
+            new_restarts = max(unused_budget // max(restart_budget, 1), 1)
+            for restart_rng in rng.spawn(new_restarts):
+                running.append(len(states))
+                states.append(self.start(tsp, restart_rng))
+                budgets.append(restart_budget)
+            budgets[-1] += unused_budget - new_restarts * restart_budget
+        return running
+
+    # Best result of the restarts, with their traces shown one after the
+    # other and the best cost found so far by all of them
+    def _merge_restarts(self, results):
         best_overall_cost = float("inf")
         best_overall_solution = None
 
-        max_attempt_objective_calls = (
-            max_objective_calls // self.num_restarts_rastringin
-        )
-
-        iteration_list = []
+        iteration_lists = []
         best_distances = []
-        distance_list = []
-
-        # Perform multiple hill climbing attempts with different starting points
-        for _ in range(self.num_restarts_rastringin):
-            (
-                current_cost,
-                current_solution,
-                attempt_iteration_list,
-                attempt_distance_list,
-                attempt_best_distances,
-            ) = self.rastrigin_hill_climbing(max_attempt_objective_calls)
-
-            for i in range(len(attempt_iteration_list)):
-                iteration_list += [len(iteration_list)]
-                if attempt_best_distances[i] < best_overall_cost:
-                    best_distances += [attempt_best_distances[i]]
-                else:
-                    best_distances += [best_overall_cost]
+        distance_lists = []
+        next_iteration = 0
+
+        for (
+            current_cost,
+            current_solution,
+            attempt_iteration_list,
+            attempt_distance_list,
+            attempt_best_distances,
+        ) in results:
+            iteration_lists.append(attempt_iteration_list + next_iteration)
+            best_distances.append(np.minimum(attempt_best_distances, best_overall_cost))
+            distance_lists.append(attempt_distance_list)
+            if len(attempt_iteration_list) > 0:
+                next_iteration += attempt_iteration_list[-1] + 1
 
             # Update best solution if current solution is better
             if current_cost < best_overall_cost:
                 best_overall_cost = current_cost
                 best_overall_solution = current_solution
 
-            distance_list += attempt_distance_list
-
         return (
             best_overall_cost,
             best_overall_solution,
-            iteration_list,
-            distance_list,
-            best_distances,
+            np.concatenate(iteration_lists),
+            np.concatenate(distance_lists),
+            np.concatenate(best_distances),
         )
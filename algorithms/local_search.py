@@ -0,0 +1,398 @@
+from collections import deque
+
+import numpy as np
+
+from helpers.budget import as_budget
+from helpers.tour import TOUR_TYPES
+from helpers.tsp_functions import TSPFunctions
+from helpers.trace_recorder import TraceRecorder
+
+
+# Local search for large TSP instances.
+#
+# Instead of scoring the whole O(n^2) neighborhood at every step, only
+# the moves that create an edge between a city and one of its k nearest
+# cities (candidate lists, see TSPFunctions.nearest_neighbors) are tried,
+# and the first improving move is applied (first improvement).
+#
+# Don't-look bits: the cities to examine are kept in a queue. A city whose
+# moves do not improve the route leaves the queue, and goes back only
+# when one of its edges is changed by a later move. The search ends at a
+# local optimum (empty queue) or when the budget is used. Each step costs
+# O(k) objective calls (each scored move is one call).
+#
+# Moves: 2-opt, Or-opt (segments of up to max_segment_length cities moved
+# next to a candidate city, in either orientation) and a bounded depth
+# Lin-Kernighan style move. All of them change the route with 2-opt
+# reversals of a Tour (see helpers/tour.py): "array" for an array with a
+# position index, "two-level" for a two-level list whose reversals take
+# O(sqrt(n)) (faster from some thousands of cities).
+#
+# The tsp_* methods are algorithms (same arguments and results as the
+# others): from a local optimum they spend the rest of the budget on
+# double-bridge kicks (iterated local search), each one followed by a
+# search around the changed edges, keeping the best route. `polish`
+# improves the final solution of another algorithm, without kicks.
+# Budget of the main run of an algorithm polished by `polishing` (a
+# LocalSearch, None: no polishing): all of `budget`, or what is left after
+# keeping polishing_share of the calls and of the time for the polishing
+def main_run_budget(budget, polishing, polishing_share):
+    if polishing is None:
+        return budget.child()
+    return budget.child(share=1 - polishing_share)
+
+
+# Charges the main run to `budget` and polishes its TSP result with the
+# rest of the budget
+def polish_result(tsp, result, budget, main_budget, polishing):
+    budget.charge(main_budget.objective_calls)
+    if polishing is not None:
+        polishing_budget = budget.child()
+        result = polishing.polish(tsp, result, polishing_budget)
+        budget.charge(polishing_budget.objective_calls)
+    return result
+
+
+class LocalSearch:
+    def __init__(self):
+        self.tsp_functions = TSPFunctions()
+        # size of the candidate lists
+        self.neighbors_k = 10
+        # moves tried at each city, in order ("2-opt", "or-opt", "lk")
+        self.moves = ("2-opt", "or-opt")
+        # longest segment moved by Or-opt
+        self.max_segment_length = 3
+        # levels of the Lin-Kernighan style move and the candidates tried
+        # at each level (1 after the last given level)
+        self.lk_depth = 5
+        self.lk_breadth = (5, 3, 1)
+        # representation of the route (see TOUR_TYPES)
+        self.tour_type = "array"
+        # kicks of the tsp_* algorithms, False: stop at the first local
+        # optimum
+        self.kicks = True
+        # trace of the search, one point per city looked at
+        self.trace_options = {"max_points": 2000}
+        # Budget.stats() of the last improve (also when polishing)
+        self.budget_stats = None
+
+    # Arguments as in HillClimbing.tsp_hill_climbing
+    def tsp_local_search(self, tsp, max_objective_calls, rng=None):
+        return self._search(tsp, max_objective_calls, rng, self.moves)
+
+    def tsp_two_opt(self, tsp, max_objective_calls, rng=None):
+        return self._search(tsp, max_objective_calls, rng, ("2-opt",))
+
+    def tsp_lin_kernighan(self, tsp, max_objective_calls, rng=None):
+        return self._search(tsp, max_objective_calls, rng, ("lk", "or-opt"))
+
+    def _search(self, tsp, max_objective_calls, rng, moves):
+        rng = np.random.default_rng(rng)
+        solution = self.tsp_functions.random_solution(tsp, rng)
+        return self._local_search(
+            tsp, solution, max_objective_calls, moves, rng if self.kicks else None
+        )
+
+    # Polishing step for the solution of another algorithm (its results
+    # tuple): the solution is improved with at most max_objective_calls (a
+    # number or a Budget) and the local search is appended to the
+    # convergence traces
+    def polish(self, tsp, result, max_objective_calls, moves=None):
+        _, solution, iteration_list, distance_list, best_distances = result
+        cost, solution, polish_iterations, _, polish_best_distances = self.improve(
+            tsp, solution, max_objective_calls, moves
+        )
+
+        next_iteration = iteration_list[-1] + 1 if len(iteration_list) > 0 else 0
+        return (
+            cost,
+            solution,
+            np.concatenate([iteration_list, polish_iterations + next_iteration]),
+            np.concatenate([distance_list, polish_best_distances]),
+            np.concatenate([best_distances, polish_best_distances]),
+        )
+
+    # Local search with candidate lists and don't-look bits, from the given
+    # solution (not changed), with the given moves (default: self.moves),
+    # until a local optimum. Same results format as the algorithms. Every
+    # scored move takes a call from the budget (see Budget.take), so the
+    # search stops exactly at the cap, deadline or cancellation.
+    def improve(self, tsp, solution, max_objective_calls, moves=None):
+        return self._local_search(
+            tsp, solution, max_objective_calls, moves or self.moves, None
+        )
+
+    # Search of improve, with kicks drawn from rng after each local optimum
+    # (None: no kicks)
+    def _local_search(self, tsp, solution, max_objective_calls, moves, rng):
+        budget = as_budget(max_objective_calls)
+        n_cities = tsp.n_cities
+        neighbors = self.tsp_functions.nearest_neighbors(
+            tsp, self.neighbors_k
+        ).tolist()
+
+        tour = TOUR_TYPES[self.tour_type](solution)
+
+        # the initial solution is always evaluated
+        cost = self.tsp_functions.calculate_cost(tsp, tour)
+        budget.charge(1)
+        trace = TraceRecorder(**self.trace_options)
+        best_cost, best_solution = float("inf"), None
+
+        queue = deque(tour)
+        queued = [True] * n_cities
+        iteration = 0
+
+        # routes this short have no move to improve them
+        if n_cities < self.max_segment_length + 4:
+            queue.clear()
+            rng = None
+
+        while not budget.exhausted():
+            if not queue:
+                # local optimum: keep it if it is the best one, else go back
+                # to the best one
+                if cost < best_cost:
+                    best_cost, best_solution = cost, tour.to_list()
+                elif cost > best_cost:
+                    tour = TOUR_TYPES[self.tour_type](best_solution)
+                    cost = best_cost
+                if rng is None or not budget.take(1):
+                    break
+
+                tour, delta, changed = self._double_bridge(tsp, tour, rng)
+                cost += delta
+                for changed_city in changed:
+                    if not queued[changed_city]:
+                        queued[changed_city] = True
+                        queue.append(changed_city)
+                continue
+
+            city = queue.popleft()
+            queued[city] = False
+
+            delta, changed = self._improve_city(
+                tsp, tour, neighbors, city, moves, budget
+            )
+
+            if delta < 0:
+                cost += delta
+                # the cities of the changed edges are looked at again
+                for changed_city in (city, *changed):
+                    if not queued[changed_city]:
+                        queued[changed_city] = True
+                        queue.append(changed_city)
+
+            trace.record(iteration, cost, min(cost, best_cost))
+            iteration += 1
+
+        # the search may stop before reaching a better local optimum
+        solution = tour.to_list() if cost <= best_cost else best_solution
+        # exact cost, without the rounding errors of the deltas
+        cost = self.tsp_functions.calculate_cost(tsp, solution)
+
+        self.budget_stats = budget.stats()
+        iteration_list, distance_list, best_costs = trace.result()
+        return cost, solution, iteration_list, distance_list, best_costs
+
+    # Double-bridge kick: the route A B C D (three random cut points)
+    # becomes A C B D, a move the other ones do not undo. Returns the new
+    # tour, the delta and the cities of the new edges.
+    def _double_bridge(self, tsp, tour, rng):
+        route = tour.to_list()
+        cut_1, cut_2, cut_3 = np.sort(
+            rng.choice(len(route) - 1, 3, replace=False) + 1
+        ).tolist()
+        a_last, b_first = route[cut_1 - 1], route[cut_1]
+        b_last, c_first = route[cut_2 - 1], route[cut_2]
+        c_last, d_first = route[cut_3 - 1], route[cut_3]
+
+        dist = tsp.distances
+        delta = (
+            dist[a_last, c_first]
+            + dist[c_last, b_first]
+            + dist[b_last, d_first]
+            - dist[a_last, b_first]
+            - dist[b_last, c_first]
+            - dist[c_last, d_first]
+        )
+        route = (
+            route[:cut_1] + route[cut_2:cut_3] + route[cut_1:cut_2] + route[cut_3:]
+        )
+        changed = (a_last, b_first, b_last, c_first, c_last, d_first)
+        return TOUR_TYPES[self.tour_type](route), float(delta), changed
+
+    # Apply the first improving move around `city`, trying the moves in
+    # order. Returns the delta (0 when none) and the cities of the edges
+    # that changed. The moves stop scoring when the budget is exhausted.
+    def _improve_city(self, tsp, tour, neighbors, city, moves, budget):
+        move_functions = {
+            "2-opt": self._two_opt_city,
+            "or-opt": self._or_opt_city,
+            "lk": self._lin_kernighan_city,
+        }
+
+        for move in moves:
+            delta, changed = move_functions[move](tsp, tour, neighbors, city, budget)
+            if delta < 0:
+                return delta, changed
+
+        return 0.0, ()
+
+    # 2-opt moves replacing the edge (a, b) next to city a, in both
+    # directions, by the edge (a, c) to a candidate c
+    def _two_opt_city(self, tsp, tour, neighbors, city_a, budget):
+        dist = tsp.distances
+        candidates = neighbors[city_a]
+
+        for forward in (True, False):
+            city_b = tour.step(city_a, forward)
+            edge_ab = dist[city_a, city_b]
+
+            for city_c in candidates:
+                edge_ac = dist[city_a, city_c]
+                # candidates are sorted: no later one can improve
+                if edge_ac >= edge_ab:
+                    break
+
+                city_d = tour.step(city_c, forward)
+                if city_c == city_b or city_d == city_a:
+                    continue
+
+                if not budget.take(1):
+                    return 0.0, ()
+                delta = edge_ac + dist[city_b, city_d] - edge_ab - dist[city_c, city_d]
+                if delta < -1e-9:
+                    tour.two_opt_move(city_a, city_b, city_c, city_d)
+                    return delta, (city_b, city_c, city_d)
+
+        return 0.0, ()
+
+    # Or-opt moves of a segment that starts at city a (going forward or
+    # backward), inserted so a is next to a candidate c
+    def _or_opt_city(self, tsp, tour, neighbors, city_a, budget):
+        dist = tsp.distances
+        candidates = neighbors[city_a]
+
+        for forward in (True, False):
+            previous = tour.step(city_a, not forward)
+            segment = [city_a]
+            for _ in range(self.max_segment_length):
+                last = segment[-1]
+                following = tour.step(last, forward)
+
+                # gain of removing the segment and closing the gap
+                removal_gain = (
+                    dist[previous, city_a]
+                    + dist[last, following]
+                    - dist[previous, following]
+                )
+
+                for city_c in candidates:
+                    if dist[city_a, city_c] >= removal_gain:
+                        break
+                    if city_c in segment or city_c in (previous, following):
+                        continue
+
+                    # between c and the next or the previous city
+                    for city_d in (
+                        tour.step(city_c, True),
+                        tour.step(city_c, False),
+                    ):
+                        if city_d in segment or city_d in (previous, following):
+                            continue
+
+                        if not budget.take(1):
+                            return 0.0, ()
+                        delta = (
+                            dist[city_c, city_a]
+                            + dist[last, city_d]
+                            - dist[city_c, city_d]
+                            - removal_gain
+                        )
+                        if delta < -1e-9:
+                            tour.or_opt_move(
+                                (previous, city_a, last, following),
+                                city_c,
+                                city_d,
+                            )
+                            changed = (previous, last, following, city_c, city_d)
+                            return delta, changed
+
+                segment.append(following)
+
+        return 0.0, ()
+
+    # Lin-Kernighan style move, of up to lk_depth levels: a chain of 2-opt
+    # flips that starts by removing the edge (t1, t2) next to city t1. At
+    # each level the edge (t2, t3) to a candidate t3 of t2 is added and the
+    # edge (t3, t4) is removed, where t4 is the city that closes the tour
+    # with the edge (t4, t1); t4 becomes the t2 of the next level.
+    #
+    # Only candidates that keep the partial gain positive are followed,
+    # the lk_breadth[level] best ones at each level (backtracking), and the
+    # first chain that improves the route when closed is kept.
+    def _lin_kernighan_city(self, tsp, tour, neighbors, city_t1, budget):
+        for forward in (True, False):
+            city_t2 = tour.step(city_t1, forward)
+            delta, changed = self._lin_kernighan_level(
+                tsp,
+                tour,
+                neighbors,
+                budget,
+                (city_t1, city_t2),
+                tsp.distances[city_t1, city_t2],
+                0,
+            )
+            if delta < 0:
+                return delta, changed
+
+        return 0.0, ()
+
+    # One level of the chain. gain: removed minus added edges so far,
+    # without the closing edge. Returns the delta of the kept chain (0 when
+    # none, the route is then restored) and the cities of the chain.
+    def _lin_kernighan_level(
+        self, tsp, tour, neighbors, budget, chain, gain, level
+    ):
+        dist = tsp.distances
+        city_t1, city_t2 = chain[0], chain[-1]
+        # direction of the route in which t2 follows t1
+        direction = tour.step(city_t1, True) == city_t2
+
+        steps = []
+        for city_t3 in neighbors[city_t2]:
+            partial_gain = gain - dist[city_t2, city_t3]
+            # candidates are sorted: no later one keeps a positive gain
+            if partial_gain <= 0:
+                break
+            city_t4 = tour.step(city_t3, not direction)
+            if city_t3 in chain or city_t4 in chain:
+                continue
+
+            if not budget.take(1):
+                break
+            steps.append((partial_gain + dist[city_t3, city_t4], city_t3, city_t4))
+
+        steps.sort(reverse=True)
+        breadth = self.lk_breadth[level] if level < len(self.lk_breadth) else 1
+
+        for step_gain, city_t3, city_t4 in steps[:breadth]:
+            tour.two_opt_move(city_t1, city_t2, city_t4, city_t3)
+            next_chain = (*chain, city_t3, city_t4)
+
+            delta = dist[city_t4, city_t1] - step_gain
+            if delta < -1e-9:
+                return delta, next_chain
+
+            if level + 1 < self.lk_depth:
+                delta, changed = self._lin_kernighan_level(
+                    tsp, tour, neighbors, budget, next_chain, step_gain, level + 1
+                )
+                if delta < 0:
+                    return delta, changed
+
+            # undo the flip
+            tour.two_opt_move(city_t1, city_t4, city_t2, city_t3)
+
+        return 0.0, ()
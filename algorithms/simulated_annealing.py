@@ -1,129 +1,451 @@
-import math
-import random
-import pandas as pd
+import copy
 
+import numpy as np
+
+from algorithms.local_search import main_run_budget, polish_result
+from helpers.budget import as_budget
+from helpers.cooling_schedules import AdaptiveCooling
+from helpers.tour import TOUR_TYPES
 from helpers.tsp_functions import TSPFunctions
+from helpers.tsp_instance import TSPInstance
 from helpers.rastrigin_functions import RastriginFunctions
+from helpers.trace_recorder import TraceRecorder
+
+
+# Endless sequence of uniform random numbers in [0, 1), drawn in blocks
+# so the annealing loops do not make one call to the generator per draw
+def uniform_stream(rng, block_size=10_000):
+    while True:
+        yield from rng.random(block_size).tolist()
+
+
+# Same for exponential variates (-ln(u) for a uniform u)
+def exponential_stream(rng, block_size=10_000):
+    while True:
+        yield from rng.standard_exponential(block_size).tolist()
+
+
+# Moves of the annealing engine for the TSP: random moves of move_type
+# (see TSPFunctions.random_moves), scored in O(1) and applied in place.
+# delta() draws and scores the next move, apply() makes it.
+class _TSPMoves:
+    def __init__(self, tsp_functions, tsp, solution, move_type, rng):
+        self.tsp_functions = tsp_functions
+        self.tsp = tsp
+        self.solution = solution
+        self.cost = tsp_functions.calculate_cost(tsp, solution)
+        self.moves = tsp_functions.random_move_stream(
+            len(solution), move_type, rng=rng
+        )
+        self.move = None
+
+    def delta(self):
+        self.move = next(self.moves)
+        return self.tsp_functions.move_delta(self.tsp, self.solution, self.move)
+
+    def apply(self):
+        self.tsp_functions.apply_move(self.solution, self.move)
+
+    def solution_copy(self):
+        return self.solution.copy()
+
+    def calculate_cost(self, solution):
+        return self.tsp_functions.calculate_cost(self.tsp, solution)
+
+    def result_solution(self, solution):
+        return list(solution)
+
+
+# Moves of the annealing engine for the Rastrigin function: a neighbor
+# (see RastriginFunctions.generate_neighbor) evaluated with one call
+class _RastriginMoves:
+    def __init__(self, rastrigin_functions, rng):
+        self.rastrigin_functions = rastrigin_functions
+        self.rng = rng
+        self.solution = rastrigin_functions.random_solution(rng)
+        self.cost = rastrigin_functions.calculate_cost(self.solution)
+        self.neighbor = None
+        self.neighbor_cost = None
+
+    def delta(self):
+        self.neighbor = self.rastrigin_functions.generate_neighbor(
+            self.solution, rng=self.rng
+        )
+        self.neighbor_cost = self.rastrigin_functions.calculate_cost(self.neighbor)
+        return self.neighbor_cost - self.cost
+
+    def apply(self):
+        self.solution = self.neighbor
+        self.cost = self.neighbor_cost
+
+    def solution_copy(self):
+        return self.solution
+
+    def calculate_cost(self, solution):
+        return self.rastrigin_functions.calculate_cost(solution)
+
+    def result_solution(self, solution):
+        return solution
 
 
 class SimulatedAnnealing:
     def __init__(self):
         self.tsp_functions = TSPFunctions()
         self.rastrigin_functions = RastriginFunctions()
+        # options of the annealing traces (see TraceRecorder)
+        self.trace_options = {"max_points": 2000}
+        # local search that polishes the final TSP solution (for example
+        # LocalSearch()) with polishing_share of the budget, None: no polishing
+        self.polishing = None
+        self.polishing_share = 0.1
+        # representation of the TSP route, except in the batched chains
+        # (see TOUR_TYPES), None: a list
+        self.tour_type = None
+        # cooling schedule of tsp_simulated_annealing and
+        # rastrigin_simulated_annealing, calibrated with calibration_samples
+        # random moves (see helpers/cooling_schedules.py)
+        self.cooling_schedule = AdaptiveCooling()
+        self.calibration_samples = 200
+        # TSP move of tsp_simulated_annealing ("swap", "2-opt" or "or-opt";
+        # "swap" or "2-opt" for the batched chains)
+        self.move_type = "2-opt"
+        # batched chains (see tsp_simulated_annealing_batch)
+        self.chains = 100
+        self.parallel_tempering = False
+        self.exchange_interval = 10
+        # Budget.stats() of the last run (objective calls, elapsed time,
+        # evaluations per second, ...)
+        self.budget_stats = None
 
     def tsp_simulated_annealing_linear_cooling(
         self,
-        tsp: pd.DataFrame,
+        tsp: TSPInstance,
         max_objective_calls: int,
         acceptance_prob: float = 1.0,
+        move_type: str = "swap",
+        rng=None,
     ):
-        current_solution = self.tsp_functions.random_solution(tsp)
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        main_budget = main_run_budget(budget, self.polishing, self.polishing_share)
+
+        current_solution = self.tsp_functions.random_solution(tsp, rng)
+        if self.tour_type is not None:
+            current_solution = TOUR_TYPES[self.tour_type](current_solution)
         current_fitness = self.tsp_functions.calculate_cost(tsp, current_solution)
+        main_budget.charge(1)
         # each iteration is an objective function call
-        max_iterations = max_objective_calls
         iteration = 1
 
-        best_solution = current_solution
+        best_solution = current_solution.copy()
         best_fitness = current_fitness
 
-        iteration_list = []
-        best_distances = []
-        distance_list = []
+        trace = TraceRecorder(**self.trace_options)
+
+        # random numbers are drawn in bulk
+        moves = self.tsp_functions.random_move_stream(
+            len(current_solution), move_type, rng=rng
+        )
+        uniforms = uniform_stream(rng)
 
-        while iteration < max_iterations:
-            new_solution = self.tsp_functions.generate_neighbor(current_solution)
-            new_fitness = self.tsp_functions.calculate_cost(tsp, new_solution)
+        while main_budget.take(1):
+            # the move is only scored here (O(1)), the route is
+            # changed in place if the move is accepted
+            move = next(moves)
+            delta = self.tsp_functions.move_delta(tsp, current_solution, move)
+            new_fitness = current_fitness + delta
             iteration += 1
 
-            # Linearly reduce acceptance probability to 0 after 90% iterations
-            acceptance_prob = max(0.0, 1.0 - (iteration / (0.9 * max_iterations)))
+            # Linearly reduce acceptance probability to 0 after 90% of the
+            # budget (of the calls or of the time)
+            acceptance_prob = max(0.0, 1.0 - (main_budget.progress() / 0.9))
 
             if new_fitness < current_fitness:
-                current_solution = new_solution
+                self.tsp_functions.apply_move(current_solution, move)
                 current_fitness = new_fitness
-            elif random.random() < acceptance_prob:
-                current_solution = new_solution
+            elif next(uniforms) < acceptance_prob:
+                self.tsp_functions.apply_move(current_solution, move)
                 current_fitness = new_fitness
 
             if new_fitness < best_fitness:
-                best_solution = new_solution
+                best_solution = current_solution.copy()
                 best_fitness = new_fitness
 
-            iteration_list += [iteration]
-            best_distances += [best_fitness]
-            distance_list += [current_fitness]
+            trace.record(iteration, current_fitness, best_fitness)
 
-        return (
+        # recompute the exact cost, removing the rounding
+        # accumulated by summing the deltas
+        best_fitness = self.tsp_functions.calculate_cost(tsp, best_solution)
+
+        iteration_list, distance_list, best_distances = trace.result()
+        result = (
             best_fitness,
-            best_solution,
+            list(best_solution),
             iteration_list,
             distance_list,
             best_distances,
         )
+        return self._finish_tsp(tsp, result, budget, main_budget)
 
-    def tsp_simulated_annealing_classic(
-        self, tsp, initial_temperature=1000.0, cooling_rate=0.997
-    ):
-        current_solution = self.tsp_functions.random_solution(tsp)
-        current_fitness = self.tsp_functions.calculate_cost(tsp, current_solution)
+    # Simulated annealing with a cooling schedule (self.cooling_schedule,
+    # see helpers/cooling_schedules.py), calibrated from the deltas of
+    # calibration_samples random moves. Same budget and results as the
+    # other algorithms.
+    def tsp_simulated_annealing(self, tsp, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        main_budget = main_run_budget(budget, self.polishing, self.polishing_share)
 
-        best_solution = current_solution
-        best_fitness = current_fitness
+        solution = self.tsp_functions.random_solution(tsp, rng)
+        if self.tour_type is not None:
+            solution = TOUR_TYPES[self.tour_type](solution)
+        moves = _TSPMoves(self.tsp_functions, tsp, solution, self.move_type, rng)
 
-        temperature = initial_temperature
+        result = self._anneal(moves, main_budget, rng)
+        return self._finish_tsp(tsp, result, budget, main_budget)
 
-        while temperature > 0.1:
-            new_solution = self.tsp_functions.generate_neighbor(current_solution)
-            new_fitness = self.tsp_functions.calculate_cost(tsp, new_solution)
+    def rastrigin_simulated_annealing(self, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        moves = _RastriginMoves(self.rastrigin_functions, rng)
+        result = self._anneal(moves, budget, rng)
+        self.budget_stats = budget.stats()
+        return result
 
-            acceptance_prob = self._acceptance_probability(
-                current_fitness, new_fitness, temperature
-            )
+    # Polishing of the TSP result with the rest of the budget
+    def _finish_tsp(self, tsp, result, budget, main_budget):
+        result = polish_result(tsp, result, budget, main_budget, self.polishing)
+        self.budget_stats = budget.stats()
+        return result
 
-            if random.random() < acceptance_prob:
-                current_solution = new_solution
-                current_fitness = new_fitness
+    # Annealing loop shared by the problems. Metropolis criterion: a move
+    # of cost change delta is accepted with probability exp(-delta / T),
+    # that is when delta < T * -ln(u) for a uniform u. The thresholds -ln(u)
+    # (exponential variates) are drawn in blocks, so each iteration makes
+    # one multiplication and one comparison instead of a call to math.exp;
+    # improving moves (delta < 0) always pass.
+    #
+    # The schedule is planned for the calls the budget is expected to
+    # allow (see Budget.expected_calls): with a deadline, from the speed
+    # of the calibration calls.
+    def _anneal(self, moves, budget, rng):
+        # the cost of the initial solution is the first objective call
+        budget.charge(1)
+        n_samples = min(self.calibration_samples, self._expected_calls(budget) // 10)
+        deltas = []
+        while len(deltas) < n_samples and budget.take(1):
+            deltas.append(moves.delta())
 
-            if new_fitness < best_fitness:
-                best_solution = new_solution
-                best_fitness = new_fitness
+        schedule = copy.copy(self.cooling_schedule)
+        temperature = schedule.start(deltas, self._expected_calls(budget))
+
+        current_cost = moves.cost
+        best_solution = moves.solution_copy()
+        best_cost = current_cost
 
-            temperature *= cooling_rate
+        trace = TraceRecorder(**self.trace_options)
+        thresholds = exponential_stream(rng)
 
-        return best_fitness, best_solution
+        while budget.take(1):
+            delta = moves.delta()
 
-    # for simulated annealing classic
-    def _acceptance_probability(self, current_distance, new_distance, temperature):
-        if new_distance < current_distance:  # melhor == menor (<)
-            return 1.0
-        return math.exp((current_distance - new_distance) / temperature)
+            accepted = delta < temperature * next(thresholds)
+            if accepted:
+                moves.apply()
+                current_cost += delta
+                if current_cost < best_cost:
+                    best_solution = moves.solution_copy()
+                    best_cost = current_cost
 
-    def rastrigin_simulated_annealing_linear_cooling(self, max_objective_calls):
-        current_solution = self.rastrigin_functions.random_solution()
+            temperature = schedule.update(accepted)
+            trace.record(budget.objective_calls, current_cost, best_cost)
+
+        # exact cost of the best solution, without the rounding errors of
+        # the deltas
+        best_cost = moves.calculate_cost(best_solution)
+
+        iteration_list, distance_list, best_distances = trace.result()
+        return (
+            best_cost,
+            moves.result_solution(best_solution),
+            iteration_list,
+            distance_list,
+            best_distances,
+        )
+
+    # Batched simulated annealing: `chains` independent chains advance
+    # together, the solutions being the rows of a matrix. At each step all
+    # the chains propose a move (one objective call each), and the costs
+    # and the accept/reject mask are computed in one pass. The result is
+    # the best solution of all the chains.
+    #
+    # The chains share the cooling schedule (updated with the share of
+    # chains that accepted their move), or, with parallel_tempering, each
+    # one keeps a fixed temperature of a geometric ladder between the
+    # calibrated initial and final temperatures, and every
+    # exchange_interval steps neighbor chains of the ladder try to swap
+    # their solutions.
+    def tsp_simulated_annealing_batch(self, tsp, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        solutions = self.tsp_functions.random_population(
+            tsp, self._chain_count(budget), rng
+        )
+        best_cost, best_solution, *traces = self._anneal_batch(
+            solutions,
+            lambda routes: self.tsp_functions.neighbor_rows(
+                routes, self.move_type, rng
+            ),
+            lambda routes: self.tsp_functions.calculate_costs(tsp, routes),
+            budget,
+            rng,
+        )
+        return (best_cost, best_solution.tolist(), *traces)
+
+    def rastrigin_simulated_annealing_batch(self, max_objective_calls, rng=None):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        problem = self.rastrigin_functions
+        solutions = problem.random_population(self._chain_count(budget), rng)
+        return self._anneal_batch(
+            solutions,
+            lambda points: problem.generate_neighbors(points, 1, rng=rng)[:, 0],
+            problem.calculate_costs,
+            budget,
+            rng,
+        )
+
+    # chains, at most one per call of the budget
+    def _chain_count(self, budget):
+        remaining = budget.remaining()
+        if remaining is None:
+            return self.chains
+        return max(min(self.chains, remaining), 1)
+
+    # Calls the budget is expected to allow, to plan the cooling
+    def _expected_calls(self, budget):
+        expected = budget.expected_calls()
+        if expected is None:
+            raise ValueError("The budget needs a call cap or a deadline")
+        return expected
+
+    # Annealing loop of the batched chains. neighbors: matrix of one
+    # neighbor per row, evaluate: costs of the rows. Metropolis criterion as
+    # in _anneal, with one exponential threshold per chain and step.
+    def _anneal_batch(self, solutions, neighbors, evaluate, budget, rng):
+        n_chains = len(solutions)
+        costs = evaluate(solutions)
+        budget.charge(n_chains)
+
+        # calibration: one move per chain, not applied
+        deltas = budget.evaluate(evaluate, neighbors(solutions))
+        deltas -= costs[: len(deltas)]
+
+        steps = -(-self._expected_calls(budget) // n_chains)
+        schedule = copy.copy(self.cooling_schedule)
+        temperature = schedule.start(deltas, steps)
+        if self.parallel_tempering:
+            # hottest chain first
+            temperature = np.geomspace(schedule.t_initial, schedule.t_final, n_chains)
+
+        best = np.argmin(costs)
+        best_cost, best_solution = float(costs[best]), solutions[best].copy()
+
+        trace = TraceRecorder(**self.trace_options)
+        step = 0
+
+        while not budget.exhausted():
+            candidates = neighbors(solutions)
+            # the last step may not have budget for all the chains
+            candidate_costs = budget.evaluate(evaluate, candidates)
+            active = len(candidate_costs)
+            if active == 0:
+                break
+
+            thresholds = rng.standard_exponential(active)
+            if self.parallel_tempering:
+                thresholds *= temperature[:active]
+            else:
+                thresholds *= temperature
+            accepted = candidate_costs - costs[:active] < thresholds
+
+            rows = np.flatnonzero(accepted)
+            solutions[rows] = candidates[rows]
+            costs[rows] = candidate_costs[rows]
+
+            best = np.argmin(costs)
+            if costs[best] < best_cost:
+                best_cost, best_solution = float(costs[best]), solutions[best].copy()
+
+            step += 1
+            if not self.parallel_tempering:
+                temperature = schedule.update(np.mean(accepted))
+            elif step % self.exchange_interval == 0:
+                exchange = step // self.exchange_interval
+                self._exchange_chains(solutions, costs, temperature, exchange, rng)
+
+            trace.record(budget.objective_calls, float(np.min(costs)), best_cost)
+
+        self.budget_stats = budget.stats()
+        iteration_list, distance_list, best_distances = trace.result()
+        return (
+            best_cost,
+            best_solution,
+            iteration_list,
+            distance_list,
+            best_distances,
+        )
+
+    # Parallel tempering exchange between the chains k and k + 1 of the
+    # ladder, for k even or odd alternately: the solutions are swapped with
+    # probability min(1, exp((1 / T_k - 1 / T_k+1) (E_k - E_k+1))) (in place)
+    def _exchange_chains(self, solutions, costs, temperatures, exchange, rng):
+        lower = np.arange(exchange % 2, len(solutions) - 1, 2)
+        upper = lower + 1
+
+        log_ratio = (1 / temperatures[lower] - 1 / temperatures[upper]) * (
+            costs[lower] - costs[upper]
+        )
+        swap = log_ratio > -rng.standard_exponential(len(lower))
+
+        rows = np.concatenate([lower[swap], upper[swap]])
+        swapped = np.concatenate([upper[swap], lower[swap]])
+        solutions[rows] = solutions[swapped]
+        costs[rows] = costs[swapped]
+
+    def rastrigin_simulated_annealing_linear_cooling(
+        self, max_objective_calls, rng=None
+    ):
+        rng = np.random.default_rng(rng)
+        budget = as_budget(max_objective_calls)
+        current_solution = self.rastrigin_functions.random_solution(rng)
         current_cost = self.rastrigin_functions.calculate_cost(current_solution)
+        budget.charge(1)
         # each iteration is an objective function call
-        max_iterations = max_objective_calls
         iteration = 1
 
         best_solution = current_solution
         best_cost = current_cost
 
-        iteration_list = []
-        best_distances = []
-        distance_list = []
+        trace = TraceRecorder(**self.trace_options)
 
-        while iteration < max_iterations:
-            new_solution = self.rastrigin_functions.generate_neighbor(current_solution)
+        uniforms = uniform_stream(rng)
+
+        while budget.take(1):
+            new_solution = self.rastrigin_functions.generate_neighbor(
+                current_solution, rng=rng
+            )
             new_cost = self.rastrigin_functions.calculate_cost(new_solution)
             iteration += 1
 
-            # Linearly reduce acceptance probability to 0 after 90% iterations
-            acceptance_prob = max(0.0, 1.0 - (iteration / (0.9 * max_iterations)))
+            # Linearly reduce acceptance probability to 0 after 90% of the
+            # budget (of the calls or of the time)
+            acceptance_prob = max(0.0, 1.0 - (budget.progress() / 0.9))
 
             if new_cost < current_cost:
                 current_solution = new_solution
                 current_cost = new_cost
-            elif random.random() < acceptance_prob:
+            elif next(uniforms) < acceptance_prob:
                 current_solution = new_solution
                 current_cost = new_cost
 
@@ -131,10 +453,10 @@ class SimulatedAnnealing:
                 best_solution = new_solution
                 best_cost = new_cost
 
-            iteration_list += [iteration]
-            best_distances += [best_cost]
-            distance_list += [current_cost]
+            trace.record(iteration, current_cost, best_cost)
 
+        self.budget_stats = budget.stats()
+        iteration_list, distance_list, best_distances = trace.result()
         return (
             best_cost,
             best_solution,
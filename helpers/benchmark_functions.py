@@ -0,0 +1,123 @@
+import numpy as np
+
+from helpers.continuous_functions import ContinuousFunctions
+from helpers.rastrigin_functions import RastriginFunctions
+
+
+# Continuous benchmark functions, with the same interface as
+# RastriginFunctions (see ContinuousFunctions). All of them are minimized,
+# evaluated over the last axis of a batch, and have their usual search
+# domain and known minimum.
+
+
+# f(x) = sum(x_i^2), minimum 0 at x = 0
+class SphereFunctions(ContinuousFunctions):
+    lower_bound = -5.12
+    upper_bound = 5.12
+    step_size = 0.2
+
+    def evaluate(self, solutions):
+        return np.sum(solutions**2, axis=-1)
+
+
+# f(x) = sum(100 (x_(i+1) - x_i^2)^2 + (1 - x_i)^2), minimum 0 at x = 1.
+# A narrow curved valley.
+class RosenbrockFunctions(ContinuousFunctions):
+    lower_bound = -5.0
+    upper_bound = 10.0
+    step_size = 0.3
+
+    def evaluate(self, solutions):
+        x, x_next = solutions[..., :-1], solutions[..., 1:]
+        return np.sum(100 * (x_next - x**2) ** 2 + (1 - x) ** 2, axis=-1)
+
+    def optimal_solution(self):
+        return np.ones(self.dimensions)
+
+
+# f(x) = -20 exp(-0.2 sqrt(mean(x_i^2))) - exp(mean(cos(2 pi x_i))) + 20 + e,
+# minimum 0 at x = 0. Almost flat far from the center, with many local
+# minima.
+class AckleyFunctions(ContinuousFunctions):
+    lower_bound = -32.768
+    upper_bound = 32.768
+    step_size = 1.3
+
+    def evaluate(self, solutions):
+        return (
+            -20 * np.exp(-0.2 * np.sqrt(np.mean(solutions**2, axis=-1)))
+            - np.exp(np.mean(np.cos(2 * np.pi * solutions), axis=-1))
+            + 20
+            + np.e
+        )
+
+
+# f(x) = sum(x_i^2) / 4000 - prod(cos(x_i / sqrt(i))) + 1, minimum 0 at x = 0
+class GriewankFunctions(ContinuousFunctions):
+    lower_bound = -600.0
+    upper_bound = 600.0
+    step_size = 24.0
+
+    def evaluate(self, solutions):
+        divisors = np.sqrt(np.arange(1, solutions.shape[-1] + 1))
+        return (
+            np.sum(solutions**2, axis=-1) / 4000
+            - np.prod(np.cos(solutions / divisors), axis=-1)
+            + 1
+        )
+
+
+# f(x) = 418.9829 d - sum(x_i sin(sqrt(|x_i|))), minimum 0 at x_i = 420.9687.
+# The second best minima are far from the best one.
+class SchwefelFunctions(ContinuousFunctions):
+    lower_bound = -500.0
+    upper_bound = 500.0
+    step_size = 20.0
+    # x_i of the minimum, and the minimum of -x sin(sqrt(|x|)) (negated)
+    argmin = 420.968746
+    offset = 418.9828872724338
+
+    def evaluate(self, solutions):
+        return self.offset * solutions.shape[-1] - np.sum(
+            solutions * np.sin(np.sqrt(np.abs(solutions))), axis=-1
+        )
+
+    def optimal_solution(self):
+        return np.full(self.dimensions, self.argmin)
+
+
+# Levy function, with w_i = 1 + (x_i - 1) / 4:
+# f(x) = sin^2(pi w_1) + sum((w_i - 1)^2 (1 + 10 sin^2(pi w_i + 1)))
+#        + (w_d - 1)^2 (1 + sin^2(2 pi w_d)),
+# the sum over i < d, minimum 0 at x = 1
+class LevyFunctions(ContinuousFunctions):
+    lower_bound = -10.0
+    upper_bound = 10.0
+    step_size = 0.4
+
+    def evaluate(self, solutions):
+        w = 1 + (solutions - 1) / 4
+        w_first, w_middle, w_last = w[..., 0], w[..., :-1], w[..., -1]
+        return (
+            np.sin(np.pi * w_first) ** 2
+            + np.sum(
+                (w_middle - 1) ** 2 * (1 + 10 * np.sin(np.pi * w_middle + 1) ** 2),
+                axis=-1,
+            )
+            + (w_last - 1) ** 2 * (1 + np.sin(2 * np.pi * w_last) ** 2)
+        )
+
+    def optimal_solution(self):
+        return np.ones(self.dimensions)
+
+
+# continuous problems, by name (each class takes the number of dimensions)
+BENCHMARK_FUNCTIONS = {
+    "Rastrigin": RastriginFunctions,
+    "Sphere": SphereFunctions,
+    "Rosenbrock": RosenbrockFunctions,
+    "Ackley": AckleyFunctions,
+    "Griewank": GriewankFunctions,
+    "Schwefel": SchwefelFunctions,
+    "Levy": LevyFunctions,
+}
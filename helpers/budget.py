@@ -0,0 +1,151 @@
+import time
+
+
+# Budget of a run: a cap on the objective calls, a wall-clock deadline, or
+# both, shared by all the parts of an algorithm (restarts, islands,
+# polishing, ...).
+#
+# Calls are granted before they are made: `take(calls)` returns how many
+# of the requested calls can still be made (and counts them), so a run
+# never goes over its cap, and `evaluate` scores only the rows of a batch
+# the budget allows. Once the cap is used, the deadline has passed or
+# `cancel()` was called (for example from another thread), the budget is
+# exhausted and the algorithms stop and return the best solution found
+# so far (anytime behavior).
+#
+# The algorithms accept a Budget wherever they take max_objective_calls
+# (see as_budget). The initial solutions of a run are always evaluated
+# (and counted with `charge`), so there is an answer even when the budget
+# is exhausted from the start. The deadline uses time.monotonic, the same
+# clock in every process of the machine, so child budgets sent to worker
+# processes keep it.
+class Budget:
+    def __init__(
+        self, max_objective_calls=None, time_limit=None, deadline=None, parent=None
+    ):
+        self.max_objective_calls = max_objective_calls
+        self.start_time = time.monotonic()
+        if time_limit is not None:
+            limit = self.start_time + time_limit
+            deadline = limit if deadline is None else min(deadline, limit)
+        self.deadline = deadline
+        # a child budget is also exhausted when its parent is (in-process)
+        self.parent = parent
+        self.objective_calls = 0
+        self.cancelled = False
+
+    # Only this budget and its in-process children see the cancellation.
+    # Budgets sent to worker processes are copies: the islands
+    # (GeneticAlgorithm.island_jobs != 1) and the restarts
+    # (HillClimbing.restart_jobs != 1) stop at the end of their current
+    # epoch or round, when this budget is checked again, and the runs of
+    # ReportFunctions.execute_tasks with n_jobs > 1 do not stop.
+    def cancel(self):
+        self.cancelled = True
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def exhausted(self):
+        if self.cancelled or self.expired():
+            return True
+        if self.parent is not None and self.parent.exhausted():
+            return True
+        return self.remaining() == 0
+
+    # calls left under the cap (None: no cap)
+    def remaining(self):
+        if self.max_objective_calls is None:
+            return None
+        return max(self.max_objective_calls - self.objective_calls, 0)
+
+    # Grant up to `calls` objective calls: returns how many can be made
+    # (0 when exhausted) and counts them
+    def take(self, calls=1):
+        if self.cancelled or self.expired():
+            return 0
+        if self.parent is not None and self.parent.exhausted():
+            return 0
+
+        remaining = self.remaining()
+        if remaining is not None:
+            calls = min(calls, remaining)
+        self.objective_calls += calls
+        return calls
+
+    # Count calls already made elsewhere (by a child budget in a worker)
+    def charge(self, calls):
+        self.objective_calls += calls
+
+    # Costs of the first rows of `batch` the budget allows (one call per
+    # row), computed with `objective` (a function of a batch)
+    def evaluate(self, objective, batch):
+        granted = self.take(len(batch))
+        return objective(batch[:granted])
+
+    # Budget for a part of the run: at most max_objective_calls of the
+    # calls left and `share` of the calls and of the time left. Its calls
+    # are counted in this budget with charge(child.objective_calls).
+    def child(self, max_objective_calls=None, share=1.0):
+        remaining = self.remaining()
+        if remaining is not None:
+            remaining = int(remaining * share)
+            if max_objective_calls is not None:
+                remaining = min(remaining, max_objective_calls)
+        else:
+            remaining = max_objective_calls
+
+        deadline = self.deadline
+        if deadline is not None and share < 1.0:
+            now = time.monotonic()
+            deadline = now + max(deadline - now, 0.0) * share
+
+        return Budget(remaining, deadline=deadline, parent=self)
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def evaluations_per_second(self):
+        elapsed = self.elapsed()
+        return self.objective_calls / elapsed if elapsed > 0 else 0.0
+
+    # Calls the run can still expect to make: the calls left under the cap,
+    # or as many as fit in the time left at the speed so far, whichever is
+    # smaller (None: no cap and no deadline)
+    def expected_calls(self):
+        expected = self.remaining()
+        if self.deadline is not None:
+            rate = max(self.objective_calls, 1) / max(self.elapsed(), 1e-9)
+            in_time = int(rate * max(self.deadline - time.monotonic(), 0.0))
+            expected = in_time if expected is None else min(expected, in_time)
+        return expected
+
+    # Share of the budget used, of the calls or of the time, whichever is
+    # larger (0 without cap and deadline)
+    def progress(self):
+        progress = 0.0
+        if self.max_objective_calls:
+            progress = self.objective_calls / self.max_objective_calls
+        if self.deadline is not None:
+            duration = self.deadline - self.start_time
+            used = self.elapsed() / duration if duration > 0 else 1.0
+            progress = max(progress, used)
+        return min(progress, 1.0)
+
+    def stats(self):
+        return {
+            "objective_calls": self.objective_calls,
+            "max_objective_calls": self.max_objective_calls,
+            "elapsed": self.elapsed(),
+            "evaluations_per_second": self.evaluations_per_second(),
+            "cancelled": self.cancelled,
+            "expired": self.expired(),
+        }
+
+
+# The budget of a run given either as a number of objective calls (the
+# usual max_objective_calls argument) or as a Budget
+def as_budget(max_objective_calls):
+    if isinstance(max_objective_calls, Budget):
+        return max_objective_calls
+    return Budget(max_objective_calls)
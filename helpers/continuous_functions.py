@@ -0,0 +1,86 @@
+import numpy as np
+
+
+# Continuous minimization problem in any number of dimensions (base class
+# of RastriginFunctions and of the benchmark functions, see
+# helpers/benchmark_functions.py).
+#
+# A solution is a NumPy vector of `dimensions` coordinates and a batch of
+# solutions is a (batch x dimensions) matrix: the costs and the neighbors
+# of a whole batch are computed with array operations, without a Python
+# loop over the solutions or the coordinates.
+#
+# A subclass gives the search domain (lower_bound and upper_bound, the same
+# for every coordinate), the standard deviation of the neighbor steps
+# (step_size), the known minimum (optimum, reached at optimal_solution)
+# and `evaluate`, the cost of each solution of a batch.
+class ContinuousFunctions:
+    lower_bound = -5.12
+    upper_bound = 5.12
+    step_size = 0.2
+    optimum = 0.0
+
+    def __init__(self, dimensions=2):
+        self.dimensions = dimensions
+
+    # Cost of each solution over the last axis of `solutions`
+    def evaluate(self, solutions):
+        raise NotImplementedError
+
+    def optimal_solution(self):
+        return np.zeros(self.dimensions)
+
+    # rng: NumPy Generator, seed or None (see np.random.default_rng)
+    def random_solution(self, rng=None):
+        return self.random_population(1, rng)[0]
+
+    # (size x dimensions) matrix of random solutions
+    def random_population(self, size, rng=None):
+        rng = np.random.default_rng(rng)
+        return rng.uniform(
+            self.lower_bound, self.upper_bound, size=(size, self.dimensions)
+        )
+
+    def calculate_cost(self, solution):
+        return float(self.evaluate(np.asarray(solution, dtype=np.float64)))
+
+    # Costs of all the rows of a (batch x dimensions) matrix
+    def calculate_costs(self, population):
+        return self.evaluate(np.asarray(population, dtype=np.float64))
+
+    def generate_neighbor(self, solution, std_dev=None, rng=None):
+        return self.generate_neighbors(solution, 1, std_dev, rng)[0]
+
+    # num_neighbors neighbors of a solution (num_neighbors x dimensions),
+    # or of each solution of a batch (batch x num_neighbors x dimensions).
+    # All the random steps are drawn at once (std_dev: step_size if None).
+    def generate_neighbors(self, solution, num_neighbors=10, std_dev=None, rng=None):
+        rng = np.random.default_rng(rng)
+        if std_dev is None:
+            std_dev = self.step_size
+        solution = np.asarray(solution, dtype=np.float64)
+        steps = rng.normal(
+            0,
+            std_dev,
+            size=(*solution.shape[:-1], num_neighbors, solution.shape[-1]),
+        )
+
+        # Ensure the neighbor values are within the bounds
+        return np.clip(
+            solution[..., None, :] + steps, self.lower_bound, self.upper_bound
+        )
+
+    def get_best_neighbor(self, solution, num_neighbors=10, rng=None):
+        best_cost = self.calculate_cost(solution)
+        best_neighbor = solution
+
+        neighbors = self.generate_neighbors(solution, num_neighbors, rng=rng)
+        costs = self.calculate_costs(neighbors)
+        objective_calls = len(neighbors)
+
+        best = np.argmin(costs)
+        if costs[best] < best_cost:
+            best_cost = float(costs[best])
+            best_neighbor = neighbors[best]
+
+        return best_neighbor, best_cost, objective_calls
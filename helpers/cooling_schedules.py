@@ -0,0 +1,208 @@
+import math
+
+import numpy as np
+
+
+# Cooling schedules for simulated annealing.
+#
+# A schedule gives the temperature of every iteration of a run. `start` is
+# called once, with the deltas of some random moves from the initial
+# solution (sampled by the algorithm) and the number of iterations of the
+# run, and sets the first temperature; `update` is called after every
+# iteration, with whether its move was accepted (for batched chains, the
+# share of the chains that accepted theirs), and returns the next one.
+#
+# Calibration: without an explicit initial_temperature / final_temperature
+# they are the temperatures at which a typical worsening move (the mean of
+# the sampled worsening deltas) is accepted with probability
+# initial_acceptance / final_acceptance, so the same schedule fits any
+# instance and any scale of costs.
+class CoolingSchedule:
+    def __init__(
+        self,
+        initial_acceptance=0.8,
+        final_acceptance=0.001,
+        final_quantile=0.05,
+        initial_temperature=None,
+        final_temperature=None,
+    ):
+        self.initial_acceptance = initial_acceptance
+        self.final_acceptance = final_acceptance
+        self.final_quantile = final_quantile
+        self.initial_temperature = initial_temperature
+        self.final_temperature = final_temperature
+        # set by start
+        self.t_initial = None
+        self.t_final = None
+        self.n_iterations = None
+        self.iteration = 0
+        self._temperature = None
+
+    # temperature of the current iteration, once start calibrated it
+    @property
+    def temperature(self):
+        if self._temperature is None:
+            raise RuntimeError(
+                f"{type(self).__name__} is not calibrated, call start first"
+            )
+        return self._temperature
+
+    @temperature.setter
+    def temperature(self, temperature):
+        self._temperature = temperature
+
+    def start(self, deltas, n_iterations):
+        deltas = np.asarray(deltas, dtype=np.float64)
+        worse = deltas[deltas > 0]
+        # all the sampled moves improve (or keep) the cost: unit scale
+        if len(worse) == 0:
+            worse = np.ones(1)
+        typical = float(worse.mean())
+        small = float(np.quantile(worse, self.final_quantile))
+
+        self.t_initial = self.initial_temperature or -typical / math.log(
+            self.initial_acceptance
+        )
+        self.t_final = self.final_temperature or -small / math.log(
+            self.final_acceptance
+        )
+        self.t_final = min(self.t_final, self.t_initial)
+
+        self.n_iterations = max(n_iterations, 1)
+        self.iteration = 0
+        self.temperature = self.t_initial
+        return self.temperature
+
+    def update(self, accepted):
+        raise NotImplementedError
+
+
+# T(k + 1) = rate * T(k), with the rate that reaches final_temperature at
+# the end of the run
+class GeometricCooling(CoolingSchedule):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # set by start
+        self.rate = None
+
+    def start(self, deltas, n_iterations):
+        super().start(deltas, n_iterations)
+        self.rate = self._rate(self.n_iterations)
+        return self.temperature
+
+    # rate from the current temperature to t_final in `iterations`
+    def _rate(self, iterations):
+        return (self.t_final / self.temperature) ** (1 / max(iterations, 1))
+
+    def update(self, accepted):
+        self.iteration += 1
+        self.temperature *= self.rate
+        return self.temperature
+
+
+# Lundy and Mees: T(k + 1) = T(k) / (1 + beta * T(k)), one move per
+# temperature. It cools fast while hot and slowly near the end; beta is
+# chosen to reach final_temperature at the end of the run.
+class LundyMeesCooling(CoolingSchedule):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # set by start
+        self.beta = None
+
+    def start(self, deltas, n_iterations):
+        super().start(deltas, n_iterations)
+        self.beta = (self.t_initial - self.t_final) / (
+            self.n_iterations * self.t_initial * self.t_final
+        )
+        return self.temperature
+
+    def update(self, accepted):
+        self.iteration += 1
+        self.temperature /= 1 + self.beta * self.temperature
+        return self.temperature
+
+
+# Geometric cooling with reheating: after `patience` (share of the run)
+# iterations in a row without an accepted move, the search is frozen in a
+# local minimum and the temperature goes back to reheat_ratio of the
+# initial temperature, scaled by the share of the run left (later reheats
+# are milder). The cooling rate is then recomputed to still end at
+# final_temperature.
+class ReheatingCooling(GeometricCooling):
+    def __init__(self, patience=0.02, reheat_ratio=0.1, **kwargs):
+        super().__init__(**kwargs)
+        self.patience = patience
+        self.reheat_ratio = reheat_ratio
+        # set by start
+        self.max_rejections = None
+        self.rejections = 0
+        self.reheats = 0
+
+    def start(self, deltas, n_iterations):
+        super().start(deltas, n_iterations)
+        self.max_rejections = max(int(self.patience * self.n_iterations), 1)
+        self.rejections = 0
+        self.reheats = 0
+        return self.temperature
+
+    def update(self, accepted):
+        temperature = self.temperature
+        self.iteration += 1
+        self.rejections = 0 if accepted else self.rejections + 1
+
+        remaining = self.n_iterations - self.iteration
+        if self.rejections >= self.max_rejections and remaining > 0:
+            left = remaining / self.n_iterations
+            reheated = self.reheat_ratio * self.t_initial * left
+            if reheated > temperature:
+                self.temperature = reheated
+                self.rate = self._rate(remaining)
+                self.reheats += 1
+            self.rejections = 0
+            return self.temperature
+
+        self.temperature = temperature * self.rate
+        return self.temperature
+
+
+# Adaptive cooling: the temperature follows a target acceptance rate that
+# goes from initial_acceptance to final_acceptance (geometrically) during
+# the run. Every `window` iterations the measured acceptance rate is
+# compared with the target and the temperature is raised or lowered
+# (by at most max_factor), so the schedule adapts to the landscape instead
+# of following a fixed curve.
+class AdaptiveCooling(CoolingSchedule):
+    def __init__(self, window=100, max_factor=2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.window = window
+        self.max_factor = max_factor
+        # acceptances in the current window
+        self.accepted = 0
+
+    def start(self, deltas, n_iterations):
+        super().start(deltas, n_iterations)
+        self.accepted = 0
+        return self.temperature
+
+    def target(self):
+        progress = self.iteration / self.n_iterations
+        return self.initial_acceptance * (
+            self.final_acceptance / self.initial_acceptance
+        ) ** min(progress, 1.0)
+
+    def update(self, accepted):
+        self.iteration += 1
+        self.accepted += accepted
+
+        if self.iteration % self.window == 0:
+            rate = self.accepted / self.window
+            target = self.target()
+            # half a window of slack, so a window without acceptances
+            # does not freeze the temperature at once
+            slack = 0.5 / self.window
+            factor = math.sqrt((target + slack) / (rate + slack))
+            factor = min(max(factor, 1 / self.max_factor), self.max_factor)
+            self.temperature *= factor
+            self.accepted = 0
+
+        return self.temperature
@@ -29,19 +29,61 @@
 # Solution Photo: http://www.math.uwaterloo.ca/tsp/world/uytour.html
 # Data Download: http://www.math.uwaterloo.ca/tsp/world/uy734.tsp
 
-import pandas as pd
+import os
+from functools import lru_cache
+from pathlib import Path
+from urllib.request import urlretrieve
+
+from helpers.tsplib import TSPLibLoader
 
 URL_CITY_COORDINATES = "https://www.math.uwaterloo.ca/tsp/world/wi29.tsp"
 
-df_coordinates = pd.read_table(
-    URL_CITY_COORDINATES,
-    skiprows=7,  # ignore the first 7 lines with information
-    names=["X", "Y"],  # column names
-    sep=" ",  # column separator
-    index_col=0,  # use col=0 as index (city names)
-    skipfooter=1,  # ignore the last line (EOF)
-    engine="python",  # to use the parser with skipfooter without warning
+# local copies of the TSPLIB files (set TSP_DATA_DIR to use another folder)
+DATA_DIR = Path(
+    os.environ.get("TSP_DATA_DIR", Path(__file__).resolve().parent.parent / "data")
 )
 
+
+# Nothing is read or downloaded when this module is imported.
+# A URL is downloaded only once, to DATA_DIR. Later runs (and machines
+# without network access) read the local copy, or the parsed instance in
+# the cache when the copy was removed. Local paths are used as is.
+def local_instance_path(source=URL_CITY_COORDINATES):
+    if "://" not in str(source):
+        return Path(source)
+
+    path = DATA_DIR / str(source).rsplit("/", 1)[-1]
+    if not path.exists() and not TSPLibLoader().is_cached(path):
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        # download to a temporary file, an interrupted
+        # download must not look like a valid instance
+        temporary_path = path.with_name(path.name + ".tmp")
+        urlretrieve(source, temporary_path)
+        temporary_path.replace(path)
+
+    return path
+
+
+# DataFrame with the city coordinates (index: city names, columns: X, Y)
+@lru_cache(maxsize=None)
+def load_coordinates(source=URL_CITY_COORDINATES):
+    return TSPLibLoader().load_coordinates(local_instance_path(source))
+
+
+# TSPInstance with the distances of the instance. rounded=False keeps the
+# real Euclidean distances used in the README results, instead of the
+# TSPLIB EUC_2D integer distances.
+@lru_cache(maxsize=None)
+def load_tsp_instance(source=URL_CITY_COORDINATES, rounded=False):
+    return TSPLibLoader().load(local_instance_path(source), rounded=rounded)
+
+
+# `df_coordinates` is still available, but only loaded on first access
+def __getattr__(name):
+    if name == "df_coordinates":
+        return load_coordinates()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # uncomment the line below to check if the data was read correctly
-# print(df_coordinates)
+# print(load_coordinates())
@@ -0,0 +1,178 @@
+from functools import lru_cache
+from math import floor, sqrt
+
+import numpy as np
+
+
+# Distance providers
+# ------------------
+# Everything that reads distances (calculate_cost, the move deltas and the
+# batched neighborhoods of TSPFunctions) only uses the lookup
+#
+#     distances[a, b]
+#
+# where a and b are city indices (returns a float) or arrays of city
+# indices, broadcast like NumPy (returns an array). A dense NumPy matrix
+# already supports it and is the fastest backend while n x n fits in memory.
+# The classes below provide the same lookup for larger instances.
+class DistanceProvider:
+    def __init__(self, n_cities):
+        self.n_cities = n_cities
+        self.shape = (n_cities, n_cities)
+
+    def __len__(self):
+        return self.n_cities
+
+    def __getitem__(self, key):
+        city_a, city_b = key
+
+        # fast path for a single pair of cities
+        if isinstance(city_a, (int, np.integer)) and isinstance(
+            city_b, (int, np.integer)
+        ):
+            return self.pair_distance(city_a, city_b)
+
+        return self.gather(np.asarray(city_a), np.asarray(city_b))
+
+    # Distance between two cities
+    def pair_distance(self, city_a, city_b):
+        raise NotImplementedError
+
+    # Distances between arrays of cities (broadcast)
+    def gather(self, cities_a, cities_b):
+        raise NotImplementedError
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def stats(self):
+        return {"backend": type(self).__name__, "nbytes": self.nbytes}
+
+
+# Upper triangle of a symmetric distance matrix stored as a flat array.
+# Uses n * (n - 1) / 2 values instead of n * n (and float32 instead of
+# float64 by default), so larger instances fit in memory.
+class CondensedDistances(DistanceProvider):
+    def __init__(self, data, n_cities):
+        super().__init__(n_cities)
+        self.data = data
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    # Position of the pair (i, j), i < j, in the flat array
+    def condensed_index(self, i, j):
+        return self.n_cities * i - i * (i + 1) // 2 + (j - i - 1)
+
+    def pair_distance(self, city_a, city_b):
+        if city_a == city_b:
+            return 0.0
+        if city_a > city_b:
+            city_a, city_b = city_b, city_a
+        return float(self.data[self.condensed_index(city_a, city_b)])
+
+    def gather(self, cities_a, cities_b):
+        i = np.minimum(cities_a, cities_b)
+        j = np.maximum(cities_a, cities_b)
+        same_city = i == j
+
+        # the diagonal is not stored, it is read from any valid
+        # position and zeroed afterwards
+        index = np.where(same_city, 0, self.condensed_index(i, j))
+        distances = self.data[index].astype(np.float64)
+        distances[same_city] = 0.0
+
+        return distances
+
+    # Expand to a dense (n x n) matrix
+    def to_dense(self):
+        dense = np.zeros(self.shape, dtype=np.float64)
+        i, j = np.triu_indices(self.n_cities, k=1)
+        dense[i, j] = self.data
+        dense[j, i] = self.data
+        return dense
+
+
+# Distances calculated on demand from the city coordinates.
+# Only the (n x 2) coordinates are kept in memory.
+# - rounded: round to the nearest integer (TSPLIB EUC_2D distance)
+class CoordinateDistances(DistanceProvider):
+    def __init__(self, coordinates, rounded=False):
+        points = np.ascontiguousarray(coordinates, dtype=np.float64)
+        super().__init__(len(points))
+        self.points = points
+        self.rounded = rounded
+        # Python floats are faster than NumPy scalars for single pairs
+        self._x = points[:, 0].tolist()
+        self._y = points[:, 1].tolist()
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes
+
+    def _compute_distance(self, city_a, city_b):
+        dx = self._x[city_a] - self._x[city_b]
+        dy = self._y[city_a] - self._y[city_b]
+        distance = sqrt(dx * dx + dy * dy)
+        if self.rounded:
+            distance = float(floor(distance + 0.5))
+        return distance
+
+    def pair_distance(self, city_a, city_b):
+        return self._compute_distance(city_a, city_b)
+
+    def gather(self, cities_a, cities_b):
+        delta = self.points[cities_a] - self.points[cities_b]
+        distances = np.sqrt((delta**2).sum(axis=-1))
+        if self.rounded:
+            distances = np.floor(distances + 0.5)
+        return distances
+
+
+# On demand distances with a bounded LRU cache of the pairs already used.
+# Local search keeps looking at the same short edges, so most single pair
+# lookups are answered by the cache. Batched lookups (gather) are cheap to
+# compute with NumPy and do not go through the cache.
+class CachedCoordinateDistances(CoordinateDistances):
+    def __init__(self, coordinates, rounded=False, cache_size=1_000_000):
+        super().__init__(coordinates, rounded)
+        self.cache_size = cache_size
+        self._cached_distance = lru_cache(maxsize=cache_size)(self._compute_distance)
+
+    def pair_distance(self, city_a, city_b):
+        # (a, b) and (b, a) share the same cache entry
+        if city_a > city_b:
+            city_a, city_b = city_b, city_a
+        return self._cached_distance(int(city_a), int(city_b))
+
+    def cache_info(self):
+        return self._cached_distance.cache_info()
+
+    def clear_cache(self):
+        self._cached_distance.cache_clear()
+
+    def stats(self):
+        info = self.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            **super().stats(),
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": info.hits / lookups if lookups else 0.0,
+            "cache_size": info.currsize,
+            "max_cache_size": info.maxsize,
+        }
+
+    # The cache is not sent to other processes, it starts empty there
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_cached_distance"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cached_distance = lru_cache(maxsize=self.cache_size)(
+            self._compute_distance
+        )
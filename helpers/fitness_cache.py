@@ -0,0 +1,74 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Bounded LRU cache of costs, keyed by a hash of each individual.
+#
+# `evaluate` returns the costs of a whole population and calls the
+# objective function only for the rows not seen before (once for rows
+# repeated in the same population), so the objective calls are spent on
+# new individuals only. The rows must already be in canonical form (see
+# TSPFunctions.canonical_tours) for equivalent solutions to share a key.
+class FitnessCache:
+    def __init__(self, max_size=100_000):
+        self.max_size = max_size
+        self.costs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # 128-bit hash of the bytes of a row (collisions are negligible)
+    def key(self, row):
+        return hashlib.blake2b(row.tobytes(), digest_size=16).digest()
+
+    # Costs of all the rows of `population` and the number of rows that
+    # were evaluated with `calculate_costs` (a function of a matrix of rows)
+    def evaluate(self, population, calculate_costs):
+        costs = np.empty(len(population), dtype=np.float64)
+
+        # rows to evaluate: key -> rows of the population with that key
+        new_rows = {}
+        for row, individual in enumerate(population):
+            key = self.key(individual)
+            cost = self.costs.get(key)
+            if cost is not None:
+                self.costs.move_to_end(key)
+                costs[row] = cost
+                self.hits += 1
+            elif key in new_rows:
+                new_rows[key].append(row)
+                self.hits += 1
+            else:
+                new_rows[key] = [row]
+                self.misses += 1
+
+        if new_rows:
+            first_rows = [rows[0] for rows in new_rows.values()]
+            new_costs = calculate_costs(population[first_rows])
+            for (key, rows), cost in zip(new_rows.items(), new_costs.tolist()):
+                costs[rows] = cost
+                self._store(key, cost)
+
+        return costs, len(new_rows)
+
+    def _store(self, key, cost):
+        self.costs[key] = cost
+        if len(self.costs) > self.max_size:
+            # least recently used
+            self.costs.popitem(last=False)
+
+    def clear(self):
+        self.costs.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "cache_size": len(self.costs),
+            "max_cache_size": self.max_size,
+        }
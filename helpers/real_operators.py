@@ -0,0 +1,106 @@
+import numpy as np
+
+
+# Crossover and mutation operators for real-coded genetic algorithms
+# (continuous problems, see ContinuousFunctions).
+#
+# As the TSP crossover operators (helpers/tsp_crossover.py), a crossover
+# receives the parents as two (m x d) matrices, row k of each one being
+# the k-th pair of parents, and returns two (m x d) matrices of children.
+# A mutation changes a (m x d) matrix of children in place. All the random
+# numbers of a generation are drawn at once; the children are kept within
+# the bounds of the problem.
+class RealCrossoverOperator:
+    def crossover(self, parents_1, parents_2, problem, rng):
+        raise NotImplementedError
+
+
+# Blend crossover (BLX-alpha): each gene of a child is uniform in the
+# interval between the genes of the parents, extended by alpha times its
+# length on both sides
+class BlendCrossover(RealCrossoverOperator):
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+
+    def crossover(self, parents_1, parents_2, problem, rng):
+        low = np.minimum(parents_1, parents_2)
+        high = np.maximum(parents_1, parents_2)
+        extension = self.alpha * (high - low)
+        low, high = low - extension, high + extension
+
+        children = low + rng.random((2, *parents_1.shape)) * (high - low)
+        children = np.clip(children, problem.lower_bound, problem.upper_bound)
+        return children[0], children[1]
+
+
+# Simulated binary crossover (SBX): the children are spread around the
+# parents as the children of a one-point crossover of binary strings.
+# A larger eta (distribution index) gives children closer to the parents.
+class SimulatedBinaryCrossover(RealCrossoverOperator):
+    def __init__(self, eta=15.0):
+        self.eta = eta
+
+    def crossover(self, parents_1, parents_2, problem, rng):
+        u = rng.random(parents_1.shape)
+        exponent = 1 / (self.eta + 1)
+        beta = np.where(
+            u <= 0.5, (2 * u) ** exponent, (1 / (2 * (1 - u))) ** exponent
+        )
+
+        mean = (parents_1 + parents_2) / 2
+        spread = beta * (parents_2 - parents_1) / 2
+        children_1 = np.clip(mean - spread, problem.lower_bound, problem.upper_bound)
+        children_2 = np.clip(mean + spread, problem.lower_bound, problem.upper_bound)
+        return children_1, children_2
+
+
+# A mutation changes each gene with probability `rate` (None: 1 / d, one
+# gene per child on average)
+class RealMutationOperator:
+    def __init__(self, rate=None):
+        self.rate = rate
+
+    def mutate(self, children, problem, rng):
+        raise NotImplementedError
+
+    # (m x d) mask of the genes to change
+    def mutation_mask(self, children, rng):
+        rate = self.rate if self.rate is not None else 1 / children.shape[1]
+        return rng.random(children.shape) < rate
+
+
+# Gaussian mutation: a normal step of standard deviation std_dev
+# (None: the neighbor step size of the problem)
+class GaussianMutation(RealMutationOperator):
+    def __init__(self, rate=None, std_dev=None):
+        super().__init__(rate)
+        self.std_dev = std_dev
+
+    def mutate(self, children, problem, rng):
+        std_dev = self.std_dev if self.std_dev is not None else problem.step_size
+        mask = self.mutation_mask(children, rng)
+        steps = rng.normal(0, std_dev, np.count_nonzero(mask))
+        children[mask] = np.clip(
+            children[mask] + steps, problem.lower_bound, problem.upper_bound
+        )
+
+
+# Polynomial mutation: a step of at most the width of the domain, from a
+# polynomial distribution concentrated near 0 (larger eta: smaller steps)
+class PolynomialMutation(RealMutationOperator):
+    def __init__(self, rate=None, eta=20.0):
+        super().__init__(rate)
+        self.eta = eta
+
+    def mutate(self, children, problem, rng):
+        mask = self.mutation_mask(children, rng)
+        u = rng.random(np.count_nonzero(mask))
+        exponent = 1 / (self.eta + 1)
+        delta = np.where(
+            u < 0.5, (2 * u) ** exponent - 1, 1 - (2 * (1 - u)) ** exponent
+        )
+
+        width = problem.upper_bound - problem.lower_bound
+        children[mask] = np.clip(
+            children[mask] + delta * width, problem.lower_bound, problem.upper_bound
+        )
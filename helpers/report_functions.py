@@ -1,13 +1,25 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, nullcontext
+from itertools import repeat
+
 import numpy as np
 import pandas as pd
 
 from helpers.plot_functions import PlotFunctions
-from helpers.coordinates import df_coordinates
+from helpers.shared_instance import shared_tsp_instance
+
+
+# Runs one execution of an algorithm with its own random stream.
+# Defined at module level so it can be sent to the worker processes.
+def run_seeded(algorithm_function, args, seed):
+    return algorithm_function(*args, rng=np.random.default_rng(seed))
 
 
 class ReportFunctions:
     def __init__(self):
         self.plot_functions = PlotFunctions()
+        # seed of the last executions, to reproduce them
+        self.last_seed = None
 
     # Create data structure (DataFrame) to store multiple results
     # and visualize them through statistics
@@ -22,6 +34,41 @@ class ReportFunctions:
 
         return df_results
 
+    # One independent random stream per (algorithm, execution), spawned
+    # from `seed`. The same seed gives bit-for-bit the same results, with
+    # any number of processes. Without a seed, a random one is drawn and
+    # kept in `last_seed`.
+    def task_seeds(self, n_tasks, seed=None):
+        seed_sequence = np.random.SeedSequence(seed)
+        self.last_seed = seed_sequence.entropy
+        return seed_sequence.spawn(n_tasks)
+
+    # Run every (algorithm, execution) task, in order: all executions of the
+    # first algorithm, then the second algorithm, ...
+    # With n_jobs > 1 (None: all cores) the tasks are spread over a process
+    # pool. Results are yielded in the task order as they become available.
+    def execute_tasks(self, algorithms, n_times, args, n_jobs=1, seed=None):
+        functions = [
+            algorithm_function
+            for algorithm_function in algorithms.values()
+            for _ in range(n_times)
+        ]
+        seeds = self.task_seeds(len(functions), seed)
+
+        if n_jobs == 1:
+            yield from map(run_seeded, functions, repeat(args), seeds)
+            return
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            yield from executor.map(run_seeded, functions, repeat(args), seeds)
+
+    # Workers map the distance matrix published in shared memory,
+    # instead of receiving a copy of the instance with each task
+    def _shared_tsp(self, tsp, n_jobs):
+        if n_jobs == 1:
+            return nullcontext(tsp)
+        return shared_tsp_instance(tsp)
+
     # Execute N times to generate cost variable statistics
     def execute_n_times_tsp(
         self,
@@ -31,11 +78,25 @@ class ReportFunctions:
         max_objective_calls,
         print_costs=False,
         print_routes=False,
+        n_jobs=1,
+        seed=None,
+    ):
+        with self._shared_tsp(tsp, n_jobs) as shared_tsp, closing(
+            self.execute_tasks(
+                algorithms, n_times, (shared_tsp, max_objective_calls), n_jobs, seed
+            )
+        ) as results:
+            return self._collect_tsp_results(
+                tsp, algorithms, n_times, results, print_costs, print_routes
+            )
+
+    def _collect_tsp_results(
+        self, tsp, algorithms, n_times, results, print_costs, print_routes
     ):
         # Create DataFrame to store the results
         df_cost = self.create_costs_df(algorithms, n_times)
 
-        for algorithm, algorithm_function in algorithms.items():
+        for algorithm in algorithms:
             print(algorithm)
             iteration_lists = []
             distance_lists = []
@@ -44,12 +105,12 @@ class ReportFunctions:
             best_solution = []
 
             for i in range(n_times):
-                cost, solution, iteration_list, distance_list, best_distances = (
-                    algorithm_function(tsp, max_objective_calls)
+                cost, solution, iteration_list, distance_list, best_distances = next(
+                    results
                 )
                 df_cost.loc[algorithm, i] = cost
 
-                print(f"{cost:10.3f}  {solution}")
+                print(f"{cost:10.3f}  {tsp.to_labels(solution)}")
                 if cost < best_cost:
                     best_cost = cost
                     best_solution = solution
@@ -66,8 +127,11 @@ class ReportFunctions:
                     filepath=f"results_tsp/{algorithm}.png",
                 )
 
-            if print_routes:
-                self.plot_functions.plot_routes(df_coordinates, best_solution)
+            # instances given only by a distance matrix have no coordinates
+            if print_routes and tsp.coordinates is not None:
+                self.plot_functions.plot_routes(
+                    tsp.coordinates_frame(), tsp.to_labels(best_solution)
+                )
 
         return df_cost
 
@@ -77,18 +141,36 @@ class ReportFunctions:
         n_times,
         max_objective_calls,
         print_costs=False,
+        n_jobs=1,
+        seed=None,
+        problem_name=None,
+    ):
+        with closing(
+            self.execute_tasks(
+                algorithms, n_times, (max_objective_calls,), n_jobs, seed
+            )
+        ) as results:
+            return self._collect_rastrigin_results(
+                algorithms, n_times, results, print_costs, problem_name
+            )
+
+    # problem_name: prefix of the file names of the graphs (for problems
+    # other than the Rastrigin function)
+    def _collect_rastrigin_results(
+        self, algorithms, n_times, results, print_costs, problem_name=None
     ):
         df_cost = self.create_costs_df(algorithms, n_times)
+        prefix = f"{problem_name} - " if problem_name else ""
 
-        for algorithm, algorithm_function in algorithms.items():
+        for algorithm in algorithms:
             print(algorithm)
             iteration_lists = []
             distance_lists = []
             best_distances_lists = []
 
             for i in range(n_times):
-                cost, solution, iteration_list, distance_list, best_distances = (
-                    algorithm_function(max_objective_calls)
+                cost, solution, iteration_list, distance_list, best_distances = next(
+                    results
                 )
                 df_cost.loc[algorithm, i] = cost
 
@@ -103,7 +185,7 @@ class ReportFunctions:
                     iteration_lists,
                     distance_lists,
                     best_distances_lists,
-                    filepath=f"results_rastrigin/{algorithm}.png",
+                    filepath=f"results_rastrigin/{prefix}{algorithm}.png",
                 )
 
         return df_cost
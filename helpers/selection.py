@@ -0,0 +1,126 @@
+import numpy as np
+
+
+# Parent selection for the genetic algorithms.
+#
+# A strategy works on the array of costs of the population (lower is
+# better) and returns row indices into the population: all the parents of
+# a generation are drawn at once, no individual is ever compared with or
+# removed from a list. `select_pairs` returns two different parents for
+# each pair of children.
+class SelectionStrategy:
+    # pairs whose parents are still the same individual after this many
+    # redraws get a second parent drawn uniformly from the others
+    max_redraws = 10
+
+    # Row indices of `count` selected individuals
+    def select(self, costs, count, rng):
+        raise NotImplementedError
+
+    def select_pairs(self, costs, count, rng):
+        parents_1 = self.select(costs, count, rng)
+        parents_2 = self.select(costs, count, rng)
+
+        same = parents_1 == parents_2
+        for _ in range(self.max_redraws):
+            if not same.any():
+                break
+            parents_2[same] = self.select(costs, np.count_nonzero(same), rng)
+            same = parents_1 == parents_2
+
+        # one individual dominates the selection (all the others have
+        # probability zero, or almost)
+        if same.any():
+            parents_2[same] = draw_excluding(len(costs), parents_1[same, None], rng)
+
+        return parents_1, parents_2
+
+
+# One random index in [0, size) for each row of `excluded`, different
+# from all the indices in that row (the rows hold distinct indices)
+def draw_excluding(size, excluded, rng):
+    drawn = rng.integers(0, size - excluded.shape[1], len(excluded))
+    # skip over the excluded indices, from the smallest to the largest
+    for column in np.sort(excluded, axis=1).T:
+        drawn += drawn >= column
+    return drawn
+
+
+# Tournament of k different individuals, the one with the lowest cost wins
+# (the first candidate drawn on ties). The two parents of a pair are
+# always different: the second one is drawn among the other individuals.
+class TournamentSelection(SelectionStrategy):
+    def __init__(self, k=2):
+        self.k = k
+
+    def select(self, costs, count, rng):
+        return self._tournaments(costs, np.empty((count, 0), dtype=np.int64), rng)
+
+    def select_pairs(self, costs, count, rng):
+        parents_1 = self.select(costs, count, rng)
+        parents_2 = self._tournaments(costs, parents_1[:, None], rng)
+        return parents_1, parents_2
+
+    # One tournament per row of `excluded`, among individuals not in that row
+    def _tournaments(self, costs, excluded, rng):
+        candidates = excluded
+        for _ in range(min(self.k, len(costs) - excluded.shape[1])):
+            candidate = draw_excluding(len(costs), candidates, rng)
+            candidates = np.column_stack([candidates, candidate])
+        candidates = candidates[:, excluded.shape[1] :]
+
+        winners = np.argmin(costs[candidates], axis=1)
+        return candidates[np.arange(len(candidates)), winners]
+
+
+# Fitness proportionate selection. The fitness of an individual is how much
+# cheaper it is than the worst one of the population (costs can be zero or
+# negative, so 1 / cost is not used).
+class RouletteSelection(SelectionStrategy):
+    def weights(self, costs):
+        return np.max(costs) - costs
+
+    def select(self, costs, count, rng):
+        cumulative = np.cumsum(self.weights(costs))
+        if cumulative[-1] <= 0:
+            # all the individuals have the same cost
+            return rng.integers(0, len(costs), count)
+
+        spins = rng.random(count) * cumulative[-1]
+        return np.searchsorted(cumulative, spins, side="right")
+
+
+# Linear ranking: the probabilities depend only on the position of each
+# individual in the population sorted by cost. pressure (between 1 and 2)
+# is how many times the best individual is expected to be selected per
+# pop_size draws (the worst one, 2 - pressure times).
+class RankSelection(RouletteSelection):
+    def __init__(self, pressure=1.5):
+        self.pressure = pressure
+
+    def weights(self, costs):
+        size = len(costs)
+        ranks = np.empty(size, dtype=np.int64)
+        ranks[np.argsort(costs, kind="stable")] = np.arange(size)
+
+        if size == 1:
+            return np.ones(1)
+        return (2 - self.pressure) + 2 * (self.pressure - 1) * (
+            (size - 1 - ranks) / (size - 1)
+        )
+
+
+# Stochastic universal sampling: a single spin of a roulette with `count`
+# equally spaced pointers. The number of times each individual is selected
+# is as close as possible to its expected value.
+class StochasticUniversalSampling(RouletteSelection):
+    def select(self, costs, count, rng):
+        cumulative = np.cumsum(self.weights(costs))
+        if cumulative[-1] <= 0:
+            return rng.integers(0, len(costs), count)
+
+        pointers = (rng.random() + np.arange(count)) * (cumulative[-1] / count)
+        selected = np.searchsorted(cumulative, pointers, side="right")
+
+        # the pointers are sorted: shuffle so the pairs are random
+        return rng.permutation(selected)
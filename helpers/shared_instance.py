@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+
+from helpers.distance_providers import CondensedDistances
+from helpers.tsp_instance import TSPInstance
+
+# instances already attached by this process (folder -> TSPInstance)
+_attached_instances = {}
+
+
+# RAM-backed folder when available (Linux), the files never touch the disk
+def default_shared_dir():
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+# Publishes a TSPInstance once, to memory-mapped files, so several
+# processes can use the same distance matrix.
+#
+# The instance returned by `publish` (or by `with SharedTSPInstance(tsp)`)
+# is pickled as the name of its folder only: sending it to a worker process
+# does not serialize the matrix, the worker maps the same files (zero-copy,
+# the operating system shares the pages). Each worker maps the files once
+# and reuses them for the next tasks, so the memory used does not grow with
+# the number of workers.
+class SharedTSPInstance:
+    def __init__(self, tsp, parent_directory=None):
+        self.tsp = tsp
+        self.parent_directory = parent_directory or default_shared_dir()
+        self.directory = None
+        self.instance = None
+
+    def publish(self):
+        if self.instance is not None:
+            return self.instance
+
+        tsp = self.tsp
+        directory = Path(
+            tempfile.mkdtemp(prefix="tsp-shared-", dir=self.parent_directory)
+        )
+
+        if isinstance(tsp.distances, CondensedDistances):
+            np.save(directory / "condensed.npy", tsp.distances.data)
+        elif isinstance(tsp.distances, np.ndarray):
+            np.save(directory / "distances.npy", tsp.distances)
+        else:
+            # distances calculated on demand only need the coordinates,
+            # which are small and can be sent to the workers as they are
+            shutil.rmtree(directory)
+            raise ValueError(
+                f"{type(tsp.distances).__name__} does not need to be shared, "
+                "send the TSPInstance to the workers directly"
+            )
+
+        np.save(directory / "labels.npy", np.asarray(tsp.labels))
+        if tsp.coordinates is not None:
+            np.save(directory / "coordinates.npy", tsp.coordinates)
+
+        self.directory = directory
+        self.instance = attach_shared_instance(str(directory))
+        return self.instance
+
+    # Remove the files. Processes that already mapped them keep their
+    # view until they finish (the operating system frees it at the end).
+    def close(self):
+        if self.instance is None:
+            return
+        _attached_instances.pop(str(self.directory), None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.instance = None
+
+    def __enter__(self):
+        return self.publish()
+
+    def __exit__(self, *_):
+        self.close()
+
+
+# Context manager giving an instance that can be sent to worker processes
+# without copying its distances: published with SharedTSPInstance when
+# needed, as it is otherwise (already shared, or distances calculated on
+# demand from the coordinates).
+def shared_tsp_instance(tsp):
+    shareable = isinstance(tsp.distances, (np.ndarray, CondensedDistances))
+    if not shareable or tsp.shared_directory is not None:
+        return nullcontext(tsp)
+    return SharedTSPInstance(tsp)
+
+
+# Map the files of a published instance (read-only).
+# Called when a shared TSPInstance is unpickled in a worker process.
+def attach_shared_instance(directory):
+    if directory in _attached_instances:
+        return _attached_instances[directory]
+
+    path = Path(directory)
+    if (path / "condensed.npy").exists():
+        data = np.load(path / "condensed.npy", mmap_mode="r")
+        labels = np.load(path / "labels.npy", allow_pickle=True)
+        distances = CondensedDistances(data, len(labels))
+    else:
+        distances = np.load(path / "distances.npy", mmap_mode="r")
+        labels = np.load(path / "labels.npy", allow_pickle=True)
+
+    coordinates = None
+    if (path / "coordinates.npy").exists():
+        coordinates = np.load(path / "coordinates.npy", mmap_mode="r")
+
+    tsp = TSPInstance(distances, labels=labels.tolist(), coordinates=coordinates)
+    tsp.shared_directory = directory
+    _attached_instances[directory] = tsp
+
+    return tsp
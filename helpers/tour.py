@@ -0,0 +1,314 @@
+from math import isqrt
+
+import numpy as np
+
+
+# Tour representations for local search on large instances.
+#
+# A route kept as a plain list needs O(n) to find where a city is and to
+# reverse a segment. The classes below keep the route of cities so that
+#
+#     next(city), prev(city)  neighbors of a city on the route, O(1)
+#     between(a, b, c)        b is on the path from a to c (going forward), O(1)
+#     reverse(a, b)           reverse the path from a to b (going forward)
+#
+# are cheap, and build the 2-opt, Or-opt and swap moves on them. Moves are
+# defined by the edges they change (not by positions), so they stay valid
+# whichever direction the route is read in. Positional reads (tour[i],
+# len(tour), iteration, np.asarray(tour)) are also supported, so the move
+# API of TSPFunctions and calculate_cost accept a tour in place of a list.
+class Tour:
+    def next(self, city):
+        raise NotImplementedError
+
+    def prev(self, city):
+        raise NotImplementedError
+
+    def between(self, city_a, city_b, city_c):
+        raise NotImplementedError
+
+    def reverse(self, city_a, city_b):
+        raise NotImplementedError
+
+    def copy(self):
+        return type(self)(self.to_list())
+
+    def to_list(self):
+        return list(self)
+
+    # the cities are not stored in an array: a copy is always made
+    def __array__(self, dtype=None, copy=None):
+        if copy is False:
+            raise ValueError("A tour cannot be converted without a copy")
+        return np.array(self.to_list(), dtype=dtype)
+
+    # Next (forward) or previous city on the route
+    def step(self, city, forward):
+        return self.next(city) if forward else self.prev(city)
+
+    # 2-opt move: replace the edges (a, b) and (c, d) by (a, c) and (b, d).
+    # b and d follow a and c in the same direction.
+    def two_opt_move(self, city_a, city_b, city_c, city_d):
+        if self.next(city_a) == city_b:
+            self.reverse(city_b, city_c)
+        else:
+            self.reverse(city_a, city_d)
+
+    # Or-opt move: the segment first ... last, between the cities previous
+    # and following, is moved between the adjacent cities c and d, with the
+    # new edges (c, first) and (last, d). Done as two or three 2-opt moves.
+    # c and d must be outside the segment.
+    def or_opt_move(self, segment_ends, city_c, city_d):
+        previous, first, last, following = segment_ends
+
+        # right before the segment: the same move read the other way
+        if city_d == previous:
+            previous, first, last, following = following, last, first, previous
+            city_c, city_d = city_d, city_c
+
+        # direction of the route in which first follows previous
+        forward = self.next(previous) == first
+
+        if self.step(city_c, forward) == city_d:
+            self.two_opt_move(previous, first, city_c, city_d)
+            if city_c != following:
+                self.two_opt_move(previous, city_c, following, last)
+            # the segment is now reversed (c, last ... first, d)
+            if first != last:
+                self.two_opt_move(city_c, last, first, city_d)
+        else:
+            self.two_opt_move(previous, first, city_d, city_c)
+            if city_d != following:
+                self.two_opt_move(previous, city_d, following, last)
+
+    # Exchange the places of two cities, with one or two 2-opt moves
+    def swap_cities(self, city_a, city_b):
+        if city_a == city_b:
+            return
+        if self.next(city_b) == city_a:
+            city_a, city_b = city_b, city_a
+
+        if self.next(city_a) == city_b:
+            self.two_opt_move(self.prev(city_a), city_a, city_b, self.next(city_b))
+            return
+
+        next_a, prev_b = self.next(city_a), self.prev(city_b)
+        self.two_opt_move(self.prev(city_a), city_a, city_b, self.next(city_b))
+        # prev_a b prev_b ... next_a a next_b
+        self.two_opt_move(city_b, prev_b, next_a, city_a)
+
+
+# Array with a position index: position[city] is the index of the city in
+# the array. Reversals take O(length of the shorter side of the route).
+class ArrayTour(Tour):
+    def __init__(self, cities):
+        self.cities = [int(city) for city in cities]
+        self.position = [0] * len(self.cities)
+        for index, city in enumerate(self.cities):
+            self.position[city] = index
+
+    def __len__(self):
+        return len(self.cities)
+
+    def __iter__(self):
+        return iter(self.cities)
+
+    def __getitem__(self, index):
+        return self.cities[index]
+
+    def next(self, city):
+        return self.cities[(self.position[city] + 1) % len(self.cities)]
+
+    def prev(self, city):
+        return self.cities[self.position[city] - 1]
+
+    def between(self, city_a, city_b, city_c):
+        a, b, c = self.position[city_a], self.position[city_b], self.position[city_c]
+        if a <= c:
+            return a <= b <= c
+        return b >= a or b <= c
+
+    # The path or the rest of the route is reversed, whichever is shorter:
+    # both give the same cycle
+    def reverse(self, city_a, city_b):
+        cities, position = self.cities, self.position
+        n_cities = len(cities)
+        i, j = position[city_a], position[city_b]
+        length = (j - i) % n_cities + 1
+        if 2 * length > n_cities:
+            i, j = (j + 1) % n_cities, (i - 1) % n_cities
+            length = n_cities - length
+
+        for _ in range(length // 2):
+            cities[i], cities[j] = cities[j], cities[i]
+            position[cities[i]] = i
+            position[cities[j]] = j
+            i = (i + 1) % n_cities
+            j = (j - 1) % n_cities
+
+
+# Segment of a TwoLevelTour: its cities, read backwards when reversed,
+# and its rank in the order of the segments
+class _Segment:
+    def __init__(self, cities, reversed_, rank):
+        self.cities = cities
+        self.reversed = reversed_
+        self.rank = rank
+
+
+# Two-level list: the route is split into about sqrt(n) segments, each with
+# a reversal bit. A reversal splits at most two segments and then only
+# reverses the order of the segments of the path and flips their bits, in
+# O(sqrt(n)). next, prev and between stay O(1). When splits made the
+# segments too many, they are rebuilt (O(n), once every O(sqrt(n))
+# reversals).
+class TwoLevelTour(Tour):
+    def __init__(self, cities, segment_size=None):
+        cities = [int(city) for city in cities]
+        self.n_cities = len(cities)
+        self.segment_size = segment_size or max(8, isqrt(self.n_cities))
+        self.segment_of = [None] * self.n_cities
+        self.index = [0] * self.n_cities
+        self._build(cities)
+
+    def copy(self):
+        return TwoLevelTour(self.to_list(), self.segment_size)
+
+    def _build(self, cities):
+        size = self.segment_size
+        self.segments = []
+        for start in range(0, len(cities), size):
+            segment = _Segment(cities[start : start + size], False, len(self.segments))
+            self.segments.append(segment)
+            self._index_segment(segment)
+        self.max_segments = 2 * len(self.segments) + 4
+
+    def _index_segment(self, segment):
+        for index, city in enumerate(segment.cities):
+            self.segment_of[city] = segment
+            self.index[city] = index
+
+    def __len__(self):
+        return self.n_cities
+
+    def __iter__(self):
+        for segment in self.segments:
+            if segment.reversed:
+                yield from reversed(segment.cities)
+            else:
+                yield from segment.cities
+
+    def __getitem__(self, position):
+        position %= self.n_cities
+        for segment in self.segments:
+            size = len(segment.cities)
+            if position < size:
+                if segment.reversed:
+                    return segment.cities[size - 1 - position]
+                return segment.cities[position]
+            position -= size
+        raise IndexError(position)
+
+    # index of the city in the order its segment is read
+    def _offset(self, city):
+        segment = self.segment_of[city]
+        if segment.reversed:
+            return len(segment.cities) - 1 - self.index[city]
+        return self.index[city]
+
+    def _first(self, segment):
+        return segment.cities[-1] if segment.reversed else segment.cities[0]
+
+    def _last(self, segment):
+        return segment.cities[0] if segment.reversed else segment.cities[-1]
+
+    def next(self, city):
+        segment = self.segment_of[city]
+        index = self.index[city] + (-1 if segment.reversed else 1)
+        if 0 <= index < len(segment.cities):
+            return segment.cities[index]
+        following = self.segments[(segment.rank + 1) % len(self.segments)]
+        return self._first(following)
+
+    def prev(self, city):
+        segment = self.segment_of[city]
+        index = self.index[city] + (1 if segment.reversed else -1)
+        if 0 <= index < len(segment.cities):
+            return segment.cities[index]
+        return self._last(self.segments[segment.rank - 1])
+
+    def between(self, city_a, city_b, city_c):
+        a = (self.segment_of[city_a].rank, self._offset(city_a))
+        b = (self.segment_of[city_b].rank, self._offset(city_b))
+        c = (self.segment_of[city_c].rank, self._offset(city_c))
+        if a <= c:
+            return a <= b <= c
+        return b >= a or b <= c
+
+    # Split the segment of the city so the city is read first in its segment
+    def _split_before(self, city):
+        offset = self._offset(city)
+        if offset > 0:
+            self._split(self.segment_of[city], offset)
+
+    # Split the segment of the city so the city is read last in its segment
+    def _split_after(self, city):
+        offset = self._offset(city) + 1
+        segment = self.segment_of[city]
+        if offset < len(segment.cities):
+            self._split(segment, offset)
+
+    # The first `offset` cities (in reading order) stay in the segment,
+    # the others go to a new segment right after it
+    def _split(self, segment, offset):
+        size = len(segment.cities)
+        if segment.reversed:
+            kept = segment.cities[size - offset :]
+            moved = segment.cities[: size - offset]
+        else:
+            kept, moved = segment.cities[:offset], segment.cities[offset:]
+
+        segment.cities = kept
+        new_segment = _Segment(moved, segment.reversed, segment.rank + 1)
+        self._index_segment(segment)
+        self._index_segment(new_segment)
+
+        self.segments.insert(segment.rank + 1, new_segment)
+        for rank in range(segment.rank + 2, len(self.segments)):
+            self.segments[rank].rank = rank
+
+    def reverse(self, city_a, city_b):
+        if city_a == city_b:
+            return
+
+        self._split_before(city_a)
+        self._split_after(city_b)
+
+        n_segments = len(self.segments)
+        first_rank = self.segment_of[city_a].rank
+        last_rank = self.segment_of[city_b].rank
+        count = (last_rank - first_rank) % n_segments + 1
+        if count == n_segments:
+            # the whole route: same cycle
+            return
+        # the path or the rest of the route, whichever has fewer segments
+        if 2 * count > n_segments:
+            first_rank = (last_rank + 1) % n_segments
+            count = n_segments - count
+
+        ranks = [(first_rank + step) % n_segments for step in range(count)]
+        reversed_segments = [self.segments[rank] for rank in reversed(ranks)]
+        for rank, segment in zip(ranks, reversed_segments):
+            self.segments[rank] = segment
+            segment.rank = rank
+            segment.reversed = not segment.reversed
+
+        if len(self.segments) > self.max_segments:
+            self._build(self.to_list())
+
+
+# tour representations, by name
+TOUR_TYPES = {
+    "array": ArrayTour,
+    "two-level": TwoLevelTour,
+}
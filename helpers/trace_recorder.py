@@ -0,0 +1,109 @@
+import numpy as np
+
+
+# Convergence trace of an algorithm run: (iteration, current cost, best cost)
+# stored in preallocated typed arrays instead of growing Python lists.
+#
+# mode selects the iterations that are kept:
+# - "all": every recorded iteration
+# - "every": one of every `every` iterations
+# - "improvements": only when the best cost improves
+# - "log": log-spaced iterations, `points_per_decade` per power of 10
+#
+# max_points (modes "all" and "every") bounds the memory used by long runs:
+# when the trace is full, every other point is dropped and only one of
+# every 2 * `every` iterations is kept from then on.
+#
+# The last recorded iteration is always part of the result, so the
+# trace covers the whole run whatever the mode.
+class TraceRecorder:
+    def __init__(
+        self,
+        mode="all",
+        every=1,
+        points_per_decade=20,
+        max_points=None,
+        capacity=1024,
+    ):
+        if mode not in ("all", "every", "improvements", "log"):
+            raise ValueError(f"Unknown trace mode: {mode}")
+
+        self.mode = mode
+        self.stride = every if mode == "every" else 1
+        self.max_points = max_points
+        self.log_ratio = 10 ** (1 / points_per_decade)
+
+        if max_points is not None:
+            capacity = max_points
+        self.iterations = np.empty(capacity, dtype=np.int64)
+        self.currents = np.empty(capacity, dtype=np.float64)
+        self.bests = np.empty(capacity, dtype=np.float64)
+        self.size = 0
+
+        self.calls = 0
+        self.next_log_call = 0
+        self.recorded_best = float("inf")
+        self.last_recorded_call = -1
+        self.last = None
+
+    def record(self, iteration, current, best):
+        self.last = (iteration, current, best)
+        calls = self.calls
+        self.calls = calls + 1
+
+        if self.mode == "improvements":
+            if best >= self.recorded_best:
+                return
+            self.recorded_best = best
+        elif self.mode == "log":
+            if calls < self.next_log_call:
+                return
+            self.next_log_call = max(calls + 1, calls * self.log_ratio)
+        elif calls % self.stride:
+            return
+
+        self._append(iteration, current, best)
+        self.last_recorded_call = calls
+
+    def _append(self, iteration, current, best):
+        if self.size == len(self.iterations):
+            if self.max_points is not None:
+                self._decimate()
+            else:
+                self._grow()
+
+        self.iterations[self.size] = iteration
+        self.currents[self.size] = current
+        self.bests[self.size] = best
+        self.size += 1
+
+    # Double the capacity of the arrays
+    def _grow(self):
+        capacity = 2 * len(self.iterations)
+        for name in ("iterations", "currents", "bests"):
+            array = getattr(self, name)
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[: self.size] = array[: self.size]
+            setattr(self, name, grown)
+
+    # Keep every other point and halve the recording rate
+    def _decimate(self):
+        kept = (self.size + 1) // 2
+        for array in (self.iterations, self.currents, self.bests):
+            array[:kept] = array[: self.size : 2]
+        self.size = kept
+        self.stride *= 2
+
+    # (iterations, current costs, best costs) as NumPy arrays
+    def result(self):
+        iterations = self.iterations[: self.size].copy()
+        currents = self.currents[: self.size].copy()
+        bests = self.bests[: self.size].copy()
+
+        if self.last is not None and self.last_recorded_call != self.calls - 1:
+            iteration, current, best = self.last
+            iterations = np.append(iterations, iteration)
+            currents = np.append(currents, current)
+            bests = np.append(bests, best)
+
+        return iterations, currents, bests
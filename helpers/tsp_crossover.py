@@ -0,0 +1,110 @@
+import numpy as np
+
+
+# Crossover operators for permutations (TSP routes).
+#
+# An operator receives the parents as two (m x n) int matrices, row k of
+# each one being the k-th pair of parents, and returns two (m x n)
+# matrices of children: all the children of a generation are produced in
+# one call, with array operations and O(n) work per child (cities are
+# looked up in (m x n) position or membership arrays, never searched for
+# in a route).
+#
+# New operators (edge recombination, EAX, ...) subclass CrossoverOperator
+# and implement `crossover`; the GA uses any of them the same way.
+class CrossoverOperator:
+    def crossover(self, parents_1, parents_2, rng):
+        raise NotImplementedError
+
+    # Two different cut points per pair, start < end (both inclusive)
+    def cut_points(self, count, size, rng):
+        point_a = rng.integers(0, size, count)
+        point_b = rng.integers(0, size - 1, count)
+        point_b += point_b >= point_a
+        return np.minimum(point_a, point_b), np.maximum(point_a, point_b)
+
+    # (m x n) mask of the positions between start and end (inclusive)
+    def segment_mask(self, start, end, size):
+        positions = np.arange(size)
+        return (positions >= start[:, None]) & (positions <= end[:, None])
+
+
+# Order crossover (OX): the child keeps the segment [start, end] of one
+# parent, the other positions are filled, starting after the segment, with
+# the remaining cities in the order they appear in the other parent.
+class OrderCrossover(CrossoverOperator):
+    def crossover(self, parents_1, parents_2, rng):
+        count, size = parents_1.shape
+        start, end = self.cut_points(count, size, rng)
+        segment = self.segment_mask(start, end, size)
+
+        child_1 = self._order_child(parents_1, parents_2, segment, end)
+        child_2 = self._order_child(parents_2, parents_1, segment, end)
+
+        return child_1, child_2
+
+    def _order_child(self, first, second, segment, end):
+        count, size = first.shape
+        rows = np.arange(count)[:, None]
+
+        # Copy the segment from the first parent
+        child = np.where(segment, first, 0).astype(first.dtype)
+
+        # in_segment[k, city]: city is in the segment copied to child k
+        in_segment = np.zeros((count, size), dtype=bool)
+        in_segment[rows, first] = segment
+
+        # Cities of the second parent that are not in the segment, in order
+        missing = ~in_segment[rows, second]
+
+        # Free positions, from the one after the segment (wrapping around)
+        free_positions = (end[:, None] + 1 + np.arange(size)) % size
+        free = np.arange(size) < size - segment.sum(axis=1)[:, None]
+
+        # both masks select the same number of items in each row, so the
+        # flattened (row-major) selections line up
+        child[np.broadcast_to(rows, (count, size))[free], free_positions[free]] = (
+            second[missing]
+        )
+
+        return child
+
+
+# Partially mapped crossover (PMX): the child keeps the segment [start, end]
+# of one parent and the other cities of the other parent in place. A city
+# of the other parent already in the segment is replaced following the
+# mapping between the two segments.
+class PartiallyMappedCrossover(CrossoverOperator):
+    def crossover(self, parents_1, parents_2, rng):
+        count, size = parents_1.shape
+        start, end = self.cut_points(count, size, rng)
+        segment = self.segment_mask(start, end, size)
+
+        child_1 = self._mapped_child(parents_1, parents_2, segment)
+        child_2 = self._mapped_child(parents_2, parents_1, segment)
+
+        return child_1, child_2
+
+    def _mapped_child(self, first, second, segment):
+        count, size = first.shape
+        rows = np.arange(count)[:, None]
+
+        child = np.where(segment, first, second)
+
+        # position of each city in the first parent and
+        # in_segment[k, city]: city is in the segment copied to child k
+        position = np.empty((count, size), dtype=np.int64)
+        position[rows, first] = np.arange(size)
+        in_segment = np.zeros((count, size), dtype=bool)
+        in_segment[rows, first] = segment
+
+        # follow the mapping until no city outside the segment is repeated
+        # (at most the length of the segment steps)
+        conflict = ~segment & in_segment[rows, child]
+        while conflict.any():
+            conflict_rows = np.nonzero(conflict)[0]
+            cities = child[conflict]
+            child[conflict] = second[conflict_rows, position[conflict_rows, cities]]
+            conflict = ~segment & in_segment[rows, child]
+
+        return child
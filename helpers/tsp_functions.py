@@ -1,9 +1,17 @@
+from itertools import repeat
 from math import sqrt
-import random
 
 import numpy as np
 import pandas as pd
 
+from helpers.distance_providers import (
+    CachedCoordinateDistances,
+    CondensedDistances,
+    CoordinateDistances,
+)
+from helpers.tour import Tour
+from helpers.tsp_instance import TSPInstance
+
 
 class TSPFunctions:
     # Euclidean distance between two points
@@ -16,52 +24,104 @@ class TSPFunctions:
     # NOTE: It is not strictly necessary to calculate them beforehand.
     #       This was done only for didactic purposes.
     #       Instead, distances can be calculated on demand.
-    def generate_distance_matrix(self, coordinates):
-        n_cities = len(coordinates)
-        dist = np.zeros((n_cities, n_cities), dtype=float)
+    #
+    # The distances are computed with NumPy broadcasting, a block of rows
+    # at a time to limit the memory used by the intermediate arrays.
+    # - rounded: round to the nearest integer (TSPLIB EUC_2D distance)
+    # - condensed: store only the upper triangle as float32
+    #   (see CondensedDistances), for instances too large for a dense matrix
+    def generate_distance_matrix(
+        self, coordinates, rounded=False, condensed=False, block_size=256
+    ):
+        points = np.asarray(coordinates, dtype=np.float64)
+        if condensed:
+            return self._condensed_distance_matrix(points, rounded, block_size)
+        return self._dense_distance_matrix(points, rounded, block_size)
+
+    def _dense_distance_matrix(self, points, rounded, block_size):
+        n_cities = len(points)
+        dist = np.empty((n_cities, n_cities), dtype=np.float64)
+        for start in range(0, n_cities, block_size):
+            stop = min(start + block_size, n_cities)
+            dist[start:stop] = self._distance_block(points, start, stop, 0, rounded)
+        return dist
 
-        for i in range(0, n_cities):
-            for j in range(i + 1, n_cities):
-                x1, y1 = coordinates.iloc[i]
-                x2, y2 = coordinates.iloc[j]
+    def _condensed_distance_matrix(self, points, rounded, block_size):
+        n_cities = len(points)
+        data = np.empty(n_cities * (n_cities - 1) // 2, dtype=np.float32)
+        for start in range(0, n_cities, block_size):
+            stop = min(start + block_size, n_cities)
+            # the upper triangle only needs the columns from `start` onwards
+            block = self._distance_block(points, start, stop, start, rounded)
 
-                dist[i, j] = self.distance(x1, y1, x2, y2)
-                dist[j, i] = dist[i, j]
+            # copy the part of each row above the diagonal
+            for i in range(start, stop):
+                offset = n_cities * i - i * (i + 1) // 2
+                data[offset : offset + n_cities - i - 1] = block[
+                    i - start, i + 1 - start :
+                ]
+        return CondensedDistances(data, n_cities)
 
-        return dist
+    # Distances from the points start:stop to the points from first_col on
+    def _distance_block(self, points, start, stop, first_col, rounded):
+        x, y = points[:, 0], points[:, 1]
+        dx = x[start:stop, None] - x[None, first_col:]
+        dy = y[start:stop, None] - y[None, first_col:]
+        block = np.sqrt(dx * dx + dy * dy)
+        if rounded:
+            # TSPLIB nint(): round half up
+            block = np.floor(block + 0.5)
+        return block
 
     # Receives a list with the real coordinates of a city and
     # generates a distance matrix between the cities.
     # Note: the matrix is symmetric and with a null diagonal
-    def generate_tsp_problem(self, df_cities: pd.DataFrame) -> pd.DataFrame:
+    #
+    # storage selects how the distances are kept (see distance_providers):
+    # - "dense": (n x n) float64 matrix, the fastest while it fits in memory
+    # - "condensed": upper triangle as float32, about 1/4 of the memory
+    # - "on-demand": calculated from the coordinates at each lookup
+    # - "cached": on demand, with an LRU cache of `cache_size` pairs
+    def generate_tsp_problem(
+        self,
+        df_cities: pd.DataFrame,
+        rounded=False,
+        storage="dense",
+        cache_size=1_000_000,
+    ) -> TSPInstance:
         # fictitious city names
         cities = df_cities.index
+        coordinates = df_cities[["X", "Y"]].to_numpy()
 
         # calculate distance matrix
-        distances = self.generate_distance_matrix(df_cities)
+        if storage in ("dense", "condensed"):
+            distances = self.generate_distance_matrix(
+                coordinates, rounded=rounded, condensed=storage == "condensed"
+            )
+        elif storage == "on-demand":
+            distances = CoordinateDistances(coordinates, rounded=rounded)
+        elif storage == "cached":
+            distances = CachedCoordinateDistances(
+                coordinates, rounded=rounded, cache_size=cache_size
+            )
+        else:
+            raise ValueError(f"Unknown distance storage: {storage}")
 
-        # create structure to store the distances between all cities
-        tsp = pd.DataFrame(distances, columns=cities, index=cities)
+        # cities are referenced by their index in the distance matrix,
+        # the names are kept only to display the solutions
+        tsp = TSPInstance(distances, labels=cities, coordinates=coordinates)
 
         return tsp
 
     # Create an initial solution with cities in a random order
-    def random_solution(self, tsp):
-        cities = list(tsp.keys())
-        solution = []
+    # rng: NumPy Generator, seed or None (see np.random.default_rng)
+    def random_solution(self, tsp, rng=None):
+        rng = np.random.default_rng(rng)
 
-        # the 3 lines below are not strictly necessary, they serve
-        # only to fix the first city of the list in the solution
-        city = cities[0]
-        solution.append(city)
-        cities.remove(city)
-
-        for _ in range(0, len(cities)):
-            # print(_, cities, solution)
-            city = random.choice(cities)
-
-            solution.append(city)
-            cities.remove(city)
+        # the first city (index 0) is kept fixed at the start of the
+        # solution, the remaining cities are visited in a random order
+        solution = [0]
+        solution += (rng.permutation(tsp.n_cities - 1) + 1).tolist()
 
         return solution
 
@@ -69,62 +129,431 @@ class TSPFunctions:
     # Note: In this case of the traveling salesman problem (TSP),
     # the cost is the length of the route between all cities.
     def calculate_cost(self, tsp, solution):
-        n = len(solution)
-        cost = 0
+        tour = np.asarray(solution)
+
+        # Each city is connected to the next one in the tour.
+        # When reaching the last city, it will be necessary
+        # to return to the start to add the
+        # length of the route from the last city
+        # to the first city, closing the cycle.
+        #
+        # Therefore np.roll, which moves the first city to the end:
+        next_cities = np.roll(tour, -1)
+
+        # all edge lengths are gathered from the matrix in a single call
+        return float(tsp.distances[tour, next_cities].sum())
+
+    # Population matrix
+    # -----------------
+    # A population of solutions is stored as a (pop_size x n) int32 matrix,
+    # one solution per row, so it can be evaluated and changed with array
+    # operations instead of a Python loop over the individuals.
+
+    # `size` random solutions (city 0 first, as in random_solution)
+    def random_population(self, tsp, size, rng=None):
+        rng = np.random.default_rng(rng)
+
+        cities = np.arange(1, tsp.n_cities, dtype=np.int32)
+        population = np.zeros((size, tsp.n_cities), dtype=np.int32)
+        population[:, 1:] = rng.permuted(np.tile(cities, (size, 1)), axis=1)
+
+        return population
+
+    # Objective function of every row of a population matrix:
+    # all the edge lengths are gathered from the distances in a single call
+    def calculate_costs(self, tsp, population):
+        next_cities = np.roll(population, -1, axis=1)
+        return np.asarray(tsp.distances[population, next_cities]).sum(axis=1)
+
+    # Canonical form of each row of a population matrix: the same tour
+    # written from any starting city, in any direction, gives the same row.
+    # Rows are rotated to start at city 0 and reversed (after city 0) when
+    # the second city is larger than the last one.
+    def canonical_tours(self, population):
+        rows = np.arange(len(population))[:, None]
+        n_cities = population.shape[1]
 
-        for i in range(n):
+        start = np.argmin(population, axis=1)
+        positions = (start[:, None] + np.arange(n_cities)) % n_cities
+        canonical = population[rows, positions]
 
-            # When reaching the last city, it will be necessary
-            # to return to the start to add the
-            # length of the route from the last city
-            # to the first city, closing the cycle.
-            #
-            # Therefore, the line below:
-            k = (i + 1) % n
-            city_a = solution[i]
-            city_b = solution[k]
+        reverse = canonical[:, 1] > canonical[:, -1]
+        canonical[reverse, 1:] = canonical[reverse, :0:-1]
 
-            cost += tsp.loc[city_a, city_b]
-            # print(tsp.loc[cityA, cityB], cityA, cityB)
+        return canonical
 
-        return cost
+    # Swap two random positions in each of the given rows (in place)
+    def swap_rows(self, population, rows, rng=None):
+        rng = np.random.default_rng(rng)
 
-    def generate_neighbor(self, route):
+        # two different positions for each row
+        n_cities = population.shape[1]
+        index_a = rng.integers(0, n_cities, len(rows))
+        index_b = rng.integers(0, n_cities - 1, len(rows))
+        index_b += index_b >= index_a
+
+        cities_a = population[rows, index_a]
+        population[rows, index_a] = population[rows, index_b]
+        population[rows, index_b] = cities_a
+
+    # Neighbors of all the rows at once: a copy of each row changed by one
+    # random "swap" or "2-opt" move (city 0 stays first), built as a
+    # single gather with a per-row index map
+    def neighbor_rows(self, population, move_type="2-opt", rng=None):
+        rng = np.random.default_rng(rng)
+        count, n_cities = population.shape
+
+        # two different positions (after the first) for each row
+        index_a = rng.integers(1, n_cities, count)
+        index_b = rng.integers(1, n_cities - 1, count)
+        index_b += index_b >= index_a
+        start = np.minimum(index_a, index_b)[:, None]
+        end = np.maximum(index_a, index_b)[:, None]
+
+        positions = np.arange(n_cities)
+        if move_type == "swap":
+            index = np.where(
+                positions == start,
+                end,
+                np.where(positions == end, start, positions),
+            )
+        elif move_type == "2-opt":
+            inside = (positions >= start) & (positions <= end)
+            index = np.where(inside, start + end - positions, positions)
+        else:
+            raise ValueError(f"Unknown move type: {move_type}")
+
+        return np.take_along_axis(population, index, axis=1)
+
+    def generate_neighbor(self, route, rng=None):
         new_route = route.copy()
 
-        # Use random.sample to get two different indices
-        index_a, index_b = random.sample(range(len(route)), 2)
+        # two different indices
+        _, index_a, index_b = self.random_move(route, "swap", rng=rng)
 
         new_route[index_a], new_route[index_b] = new_route[index_b], new_route[index_a]
 
         return new_route
 
-    # From a given solution, generates several variations (neighbors)
-    def generate_neighbors(self, solution):
+    # Move evaluation API
+    # -------------------
+    # A move is a tuple (move_type, *positions). Instead of copying the route
+    # and recomputing its whole length, the cost change (delta) of a move is
+    # obtained from the few edges it removes and adds, in O(1). The route is
+    # only changed (in place) by apply_move, once the move is accepted.
+
+    # Swap the cities at positions i and j
+    def swap_delta(self, tsp, route, i, j):
+        dist = tsp.distances
+        n = len(route)
+        if i > j:
+            i, j = j, i
+
+        city_i, city_j = route[i], route[j]
+        prev_i, next_j = route[i - 1], route[(j + 1) % n]
+
+        # adjacent positions: the edge between them is kept
+        if j - i == 1:
+            return (
+                dist[prev_i, city_j]
+                + dist[city_i, next_j]
+                - dist[prev_i, city_i]
+                - dist[city_j, next_j]
+            )
+        # adjacent through the end of the route (last -> first)
+        if i == 0 and j == n - 1:
+            prev_j, next_i = route[j - 1], route[i + 1]
+            return (
+                dist[prev_j, city_i]
+                + dist[city_j, next_i]
+                - dist[prev_j, city_j]
+                - dist[city_i, next_i]
+            )
+
+        next_i, prev_j = route[i + 1], route[j - 1]
+        return (
+            dist[prev_i, city_j]
+            + dist[city_j, next_i]
+            + dist[prev_j, city_i]
+            + dist[city_i, next_j]
+            - dist[prev_i, city_i]
+            - dist[city_i, next_i]
+            - dist[prev_j, city_j]
+            - dist[city_j, next_j]
+        )
+
+    # The apply_* methods change the route in place. The route can also be
+    # a Tour (see helpers/tour.py), changed with its edge based moves: the
+    # resulting cycle is the same, read from another start or direction.
+    def apply_swap(self, route, i, j):
+        if isinstance(route, Tour):
+            route.swap_cities(route[i], route[j])
+            return
+        route[i], route[j] = route[j], route[i]
+
+    # 2-opt: reverse the segment between positions i and j (inclusive)
+    def two_opt_delta(self, tsp, route, i, j):
+        dist = tsp.distances
+        n = len(route)
+        if i > j:
+            i, j = j, i
+
+        # reversing the whole route gives the same cycle
+        if i == 0 and j == n - 1:
+            return 0.0
+
+        prev_i, next_j = route[i - 1], route[(j + 1) % n]
+        return (
+            dist[prev_i, route[j]]
+            + dist[route[i], next_j]
+            - dist[prev_i, route[i]]
+            - dist[route[j], next_j]
+        )
+
+    def apply_two_opt(self, route, i, j):
+        if i > j:
+            i, j = j, i
+        if isinstance(route, Tour):
+            n = len(route)
+            if i == 0 and j == n - 1:
+                return
+            route.two_opt_move(route[i - 1], route[i], route[j], route[(j + 1) % n])
+            return
+        route[i : j + 1] = route[i : j + 1][::-1]
+
+    # Or-opt: move the segment of `length` cities starting at position i
+    # to between positions j and j + 1 (optionally reversed).
+    # j must be outside the segment and not the city right before it.
+    def or_opt_delta(self, tsp, route, i, length, j, reverse=False):
+        dist = tsp.distances
+        n = len(route)
+        first, last = route[i], route[i + length - 1]
+        prev_seg, next_seg = route[i - 1], route[(i + length) % n]
+        city_j, next_j = route[j], route[(j + 1) % n]
+        if reverse:
+            first, last = last, first
+
+        return (
+            dist[prev_seg, next_seg]
+            + dist[city_j, first]
+            + dist[last, next_j]
+            - dist[prev_seg, route[i]]
+            - dist[route[i + length - 1], next_seg]
+            - dist[city_j, next_j]
+        )
+
+    def apply_or_opt(self, route, i, length, j, reverse=False):
+        if isinstance(route, Tour):
+            n = len(route)
+            previous, following = route[i - 1], route[(i + length) % n]
+            first, last = route[i], route[i + length - 1]
+            segment_ends = (previous, first, last, following)
+            if reverse:
+                # (c, last) and (first, d): the segment read the other way
+                segment_ends = (following, last, first, previous)
+            route.or_opt_move(segment_ends, route[j], route[(j + 1) % n])
+            return
+
+        segment = route[i : i + length].copy()
+        if reverse:
+            segment = segment[::-1]
+
+        if j > i:
+            # cities between the segment and j shift back to fill the gap
+            route[i : j - length + 1] = route[i + length : j + 1]
+            route[j - length + 1 : j + 1] = segment
+        else:
+            # cities between j and the segment shift forward
+            route[j + length + 1 : i + length] = route[j + 1 : i]
+            route[j + 1 : j + length + 1] = segment
+
+    # Draw `count` random moves of the given type for a route of n cities.
+    # All the random numbers are drawn at once, with array operations.
+    def random_moves(
+        self, n, count, move_type="swap", max_segment_length=3, rng=None
+    ):
+        rng = np.random.default_rng(rng)
+
+        if move_type == "or-opt":
+            lengths = rng.integers(1, min(max_segment_length, n - 3) + 1, size=count)
+            starts = rng.integers(0, n - lengths + 1)
+            # any position outside the segment, except the city right before it
+            ends = (starts + lengths + rng.integers(0, n - lengths - 1)) % n
+            reverse = rng.random(count) < 0.5
+            return list(
+                zip(
+                    repeat("or-opt"),
+                    starts.tolist(),
+                    lengths.tolist(),
+                    ends.tolist(),
+                    reverse.tolist(),
+                )
+            )
+
+        # two different positions
+        first = rng.integers(0, n, size=count)
+        second = rng.integers(0, n - 1, size=count)
+        second += second >= first
+        return list(zip(repeat(move_type), first.tolist(), second.tolist()))
+
+    # Draw a random move of the given type for a route
+    def random_move(self, route, move_type="swap", max_segment_length=3, rng=None):
+        return self.random_moves(len(route), 1, move_type, max_segment_length, rng)[0]
+
+    # Endless sequence of random moves, drawn in blocks of `block_size`
+    # so the loops that consume them do not draw one move per call
+    def random_move_stream(
+        self, n, move_type="swap", max_segment_length=3, rng=None, block_size=10_000
+    ):
+        rng = np.random.default_rng(rng)
+        while True:
+            yield from self.random_moves(
+                n, block_size, move_type, max_segment_length, rng
+            )
+
+    def move_delta(self, tsp, route, move):
+        move_type, *args = move
+        if move_type == "swap":
+            return self.swap_delta(tsp, route, *args)
+        if move_type == "2-opt":
+            return self.two_opt_delta(tsp, route, *args)
+        if move_type == "or-opt":
+            return self.or_opt_delta(tsp, route, *args)
+        raise ValueError(f"Unknown move type: {move_type}")
+
+    def apply_move(self, route, move):
+        move_type, *args = move
+        if move_type == "swap":
+            self.apply_swap(route, *args)
+        elif move_type == "2-opt":
+            self.apply_two_opt(route, *args)
+        elif move_type == "or-opt":
+            self.apply_or_opt(route, *args)
+        else:
+            raise ValueError(f"Unknown move type: {move_type}")
+
+    # Batched neighborhood evaluation
+    # -------------------------------
+    # Scores the whole swap or 2-opt neighborhood of a solution at once with
+    # array operations over the distance matrix. Returns a (n x n) matrix
+    # where deltas[i, j] is the cost change of the move (i, j); positions
+    # outside the neighborhood (i >= j or i == 0) are set to infinity.
+    def neighborhood_deltas(self, tsp, solution, neighborhood="swap"):
+        dist = tsp.distances
+        tour = np.asarray(solution)
+        n = len(tour)
+        prev_cities = np.roll(tour, 1)
+        next_cities = np.roll(tour, -1)
+
+        # edges entering and leaving each position
+        edge_in = dist[prev_cities, tour]
+        edge_out = dist[tour, next_cities]
+
+        if neighborhood == "swap":
+            # city j placed at position i: new edges around position i
+            placed = (
+                dist[prev_cities[:, None], tour[None, :]]
+                + dist[tour[None, :], next_cities[:, None]]
+            )
+            removed = edge_in + edge_out
+            deltas = placed + placed.T - removed[:, None] - removed[None, :]
+
+            # adjacent positions share an edge, which is kept
+            i = np.arange(n - 1)
+            deltas[i, i + 1] = (
+                dist[prev_cities[i], tour[i + 1]]
+                + dist[tour[i], next_cities[i + 1]]
+                - edge_in[i]
+                - edge_out[i + 1]
+            )
+        elif neighborhood == "2-opt":
+            deltas = (
+                dist[prev_cities[:, None], tour[None, :]]
+                + dist[tour[:, None], next_cities[None, :]]
+                - edge_in[:, None]
+                - edge_out[None, :]
+            )
+        else:
+            raise ValueError(f"Unknown neighborhood: {neighborhood}")
+
+        # keep only i < j and the first city fixed
+        deltas[np.tril_indices(n)] = np.inf
+        deltas[0, :] = np.inf
+
+        return deltas
+
+    # Objective calls of scoring the whole neighborhood of a n-city route
+    # (each scored move is an objective call)
+    def neighborhood_size(self, n, neighborhood="swap"):
+        size = (n - 1) * (n - 2) // 2
+        if neighborhood == "swap":
+            # one more call per row, as the list-based swap neighborhood
+            # this replaced, to keep the same objective calls budget
+            size += n - 1
+        return size
+
+    # Best move of the neighborhood, without building any neighbor route.
+    # max_moves: score only the first max_moves moves, in row-major order
+    # (None: all), when the budget does not allow the whole neighborhood
+    def get_best_move(self, tsp, solution, neighborhood="swap", max_moves=None):
         n = len(solution)
-        neighbors = []
-        for i in range(1, n):  # keep the first fixed
-            for j in range(i + 1, n):
-                neighbor = solution.copy()
-                neighbor[i] = solution[j]
-                neighbor[j] = solution[i]
-                neighbors.append(neighbor)
-                # yield neighbor
-            neighbors.append(neighbor)
-        return neighbors
+        deltas = self.neighborhood_deltas(tsp, solution, neighborhood)
+        objective_calls = self.neighborhood_size(n, neighborhood)
+
+        if max_moves is not None and max_moves < objective_calls:
+            # positions of the moves in row-major order
+            moves = np.flatnonzero(np.isfinite(deltas))[:max_moves]
+            scored = np.full(deltas.shape, np.inf)
+            scored.flat[moves] = deltas.flat[moves]
+            deltas = scored
+            objective_calls = max_moves
+
+        # argmin returns the first minimum in row-major order
+        i, j = divmod(int(np.argmin(deltas)), n)
+        best_move = (neighborhood, i, j)
+        best_delta = float(deltas[i, j])
 
-    def get_best_neighbor(self, tsp, solution):
+        return best_move, best_delta, objective_calls
+
+    def get_best_neighbor(self, tsp, solution, neighborhood="swap", max_moves=None):
         best_cost = self.calculate_cost(tsp, solution)
-        best_neighbor = solution
-        objective_calls = 0
 
-        neighbors = self.generate_neighbors(solution)
+        best_move, best_delta, objective_calls = self.get_best_move(
+            tsp, solution, neighborhood, max_moves
+        )
+
+        # only an improving move produces a new solution
+        if best_delta >= 0:
+            return solution, best_cost, objective_calls
+
+        best_neighbor = solution.copy()
+        self.apply_move(best_neighbor, best_move)
+
+        return best_neighbor, best_cost + best_delta, objective_calls
 
-        for neighbor in neighbors:
-            current_cost = self.calculate_cost(tsp, neighbor)
-            objective_calls += 1
-            if current_cost < best_cost:
-                best_cost = current_cost
-                best_neighbor = neighbor
+    # Candidate lists: the k nearest cities of each city, closest first,
+    # as a (n x k) int32 matrix. The distances are read a block of rows at
+    # a time, so it works with any distance storage (also explicit
+    # instances without coordinates) and never holds more than
+    # block_size x n distances.
+    def nearest_neighbors(self, tsp, k=10, block_size=256):
+        n_cities = tsp.n_cities
+        k = min(k, n_cities - 1)
+        cities = np.arange(n_cities)
+        neighbors = np.empty((n_cities, k), dtype=np.int32)
 
-        return best_neighbor, best_cost, objective_calls
+        for start in range(0, n_cities, block_size):
+            rows = cities[start : start + block_size]
+            block = np.array(
+                tsp.distances[rows[:, None], cities[None, :]], dtype=np.float64
+            )
+            # a city is not its own neighbor
+            block[np.arange(len(rows)), rows] = np.inf
+
+            nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+            order = np.argsort(
+                np.take_along_axis(block, nearest, axis=1), axis=1, kind="stable"
+            )
+            neighbors[rows] = np.take_along_axis(nearest, order, axis=1)
+
+        return neighbors
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+
+# Compact representation of a TSP instance.
+# Cities are identified by their integer index (0 .. n-1), so a tour is just
+# a sequence of indices into the distance matrix. The original city labels
+# are kept only to display solutions (prints, route plots).
+class TSPInstance:
+    def __init__(self, distances, labels=None, coordinates=None):
+        # contiguous float64 matrix: distances[a, b] is a plain array lookup.
+        # Distance providers (see helpers.distance_providers) are kept as
+        # they are, they support the same distances[a, b] lookups.
+        if isinstance(distances, np.ndarray):
+            distances = np.ascontiguousarray(distances, dtype=np.float64)
+        self.distances = distances
+        self.n_cities = len(self.distances)
+
+        if labels is None:
+            labels = range(1, self.n_cities + 1)
+        self.labels = list(labels)
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+
+        # (n_cities x 2) array with the X, Y position of each city (optional)
+        if coordinates is not None:
+            coordinates = np.ascontiguousarray(coordinates, dtype=np.float64)
+        self.coordinates = coordinates
+
+        # folder of the memory-mapped files, when published with
+        # SharedTSPInstance (see helpers.shared_instance)
+        self.shared_directory = None
+
+    def __len__(self):
+        return self.n_cities
+
+    # A shared instance is pickled as the name of its folder: the receiving
+    # process maps the same files instead of copying the distance matrix
+    def __reduce_ex__(self, protocol):
+        if self.shared_directory is not None:
+            # pylint: disable=import-outside-toplevel  # avoid a circular import
+            from helpers.shared_instance import attach_shared_instance
+
+            return attach_shared_instance, (self.shared_directory,)
+        return super().__reduce_ex__(protocol)
+
+    # Memory used by the distances and, for cached providers,
+    # the cache hit/miss counters
+    def distance_stats(self):
+        if isinstance(self.distances, np.ndarray):
+            return {"backend": "dense", "nbytes": self.distances.nbytes}
+        return self.distances.stats()
+
+    # Translate a tour of city indices to the original city labels
+    def to_labels(self, tour):
+        return [self.labels[city] for city in tour]
+
+    # Translate a tour of city labels to city indices
+    def to_indices(self, labels):
+        return [self.label_index[label] for label in labels]
+
+    # City coordinates as a DataFrame (index: city labels, columns: X, Y)
+    def coordinates_frame(self):
+        return pd.DataFrame(self.coordinates, columns=["X", "Y"], index=self.labels)
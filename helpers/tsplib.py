@@ -0,0 +1,262 @@
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from helpers.tsp_functions import TSPFunctions
+from helpers.tsp_instance import TSPInstance
+
+# parsed instances are cached here (see TSPLibLoader)
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "data" / "cache"
+
+# number of values in the EDGE_WEIGHT_SECTION for each EDGE_WEIGHT_FORMAT
+# and the triangle (k of np.triu_indices / np.tril_indices) they fill,
+# read row by row. A column-wise upper triangle has the same order as a
+# row-wise lower triangle (and vice versa).
+EXPLICIT_FORMATS = {
+    "UPPER_ROW": ("upper", 1),
+    "LOWER_COL": ("upper", 1),
+    "UPPER_DIAG_ROW": ("upper", 0),
+    "LOWER_DIAG_COL": ("upper", 0),
+    "LOWER_ROW": ("lower", -1),
+    "UPPER_COL": ("lower", -1),
+    "LOWER_DIAG_ROW": ("lower", 0),
+    "UPPER_DIAG_COL": ("lower", 0),
+}
+
+
+# Reads TSPLIB .tsp files from the local disk.
+# The header (DIMENSION, EDGE_WEIGHT_TYPE, ...) is parsed instead of
+# skipping a fixed number of lines, so any instance of the library can be
+# used. Supported EDGE_WEIGHT_TYPEs: EUC_2D, CEIL_2D, ATT, GEO and
+# EXPLICIT (all the symmetric EDGE_WEIGHT_FORMATs).
+#
+# The parsed data and the distance matrix are saved to `cache_dir` as .npy
+# files. Later runs memory-map them instead of parsing the file and
+# computing the distances again (cache_dir=None disables the cache), also
+# when the .tsp file is no longer there (see _cache_path).
+class TSPLibLoader:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.tsp_functions = TSPFunctions()
+
+    # Parse a .tsp file. Returns the header (dict), the city labels, the
+    # coordinates (n x 2 array, None for EXPLICIT instances without
+    # DISPLAY_DATA) and the explicit edge weights (n x n array or None)
+    def parse(self, path):
+        with open(path, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+
+        header = {}
+        labels = None
+        coordinates = None
+        weights = None
+
+        i = 0
+        while i < len(lines):
+            line = lines[i].strip()
+            i += 1
+            if not line or line == "EOF":
+                continue
+
+            section = line.split(":")[0].strip()
+            if section in ("NODE_COORD_SECTION", "DISPLAY_DATA_SECTION"):
+                n_cities = int(header["DIMENSION"])
+                rows = np.array(
+                    " ".join(lines[i : i + n_cities]).split(), dtype=np.float64
+                ).reshape(n_cities, -1)
+                i += n_cities
+                # NODE_COORD_SECTION has priority over DISPLAY_DATA_SECTION
+                if coordinates is None or section == "NODE_COORD_SECTION":
+                    labels = rows[:, 0].astype(np.int64)
+                    coordinates = rows[:, 1:3]
+            elif section == "EDGE_WEIGHT_SECTION":
+                weights, i = self._read_edge_weights(lines, i, header)
+            elif section.endswith("_SECTION"):
+                # sections not used here (TOUR_SECTION, FIXED_EDGES_SECTION)
+                while i < len(lines) and lines[i].strip() not in ("-1", "EOF"):
+                    i += 1
+            elif ":" in line:
+                key, value = line.split(":", 1)
+                header[key.strip()] = value.strip()
+
+        if labels is None:
+            labels = np.arange(1, int(header["DIMENSION"]) + 1)
+
+        return header, labels, coordinates, weights
+
+    def _read_edge_weights(self, lines, i, header):
+        n_cities = int(header["DIMENSION"])
+        weight_format = header.get("EDGE_WEIGHT_FORMAT", "FULL_MATRIX")
+
+        if weight_format == "FULL_MATRIX":
+            n_values = n_cities * n_cities
+        elif weight_format in EXPLICIT_FORMATS:
+            _, k = EXPLICIT_FORMATS[weight_format]
+            n_values = n_cities * (n_cities + 1) // 2 - abs(k) * n_cities
+        else:
+            raise ValueError(f"Unsupported EDGE_WEIGHT_FORMAT: {weight_format}")
+
+        # the values can be split over the lines in any way
+        values = []
+        while len(values) < n_values:
+            values += lines[i].split()
+            i += 1
+        values = np.array(values[:n_values], dtype=np.float64)
+
+        if weight_format == "FULL_MATRIX":
+            return values.reshape(n_cities, n_cities), i
+
+        triangle, k = EXPLICIT_FORMATS[weight_format]
+        if triangle == "upper":
+            rows, cols = np.triu_indices(n_cities, k=k)
+        else:
+            rows, cols = np.tril_indices(n_cities, k=k)
+        weights = np.zeros((n_cities, n_cities), dtype=np.float64)
+        weights[rows, cols] = values
+        weights[cols, rows] = values
+
+        return weights, i
+
+    # Distance matrix following the TSPLIB definition of each EDGE_WEIGHT_TYPE.
+    # rounded=False keeps the real (not rounded) Euclidean distances of EUC_2D.
+    def distance_matrix(self, header, coordinates, weights, rounded=True):
+        edge_weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D")
+
+        if edge_weight_type == "EXPLICIT":
+            return weights
+        if edge_weight_type == "EUC_2D":
+            return self.tsp_functions.generate_distance_matrix(
+                coordinates, rounded=rounded
+            )
+        if edge_weight_type == "CEIL_2D":
+            return np.ceil(self.tsp_functions.generate_distance_matrix(coordinates))
+
+        x, y = coordinates[:, 0], coordinates[:, 1]
+        if edge_weight_type == "ATT":
+            # pseudo-Euclidean distance
+            dx = x[:, None] - x[None, :]
+            dy = y[:, None] - y[None, :]
+            r = np.sqrt((dx * dx + dy * dy) / 10.0)
+            t = np.floor(r + 0.5)
+            return np.where(t < r, t + 1.0, t)
+        if edge_weight_type == "GEO":
+            # coordinates are DDD.MM (degrees and minutes)
+            degrees = np.trunc(coordinates)
+            minutes = coordinates - degrees
+            radians = np.pi * (degrees + 5.0 * minutes / 3.0) / 180.0
+            latitude, longitude = radians[:, 0], radians[:, 1]
+            q1 = np.cos(longitude[:, None] - longitude[None, :])
+            q2 = np.cos(latitude[:, None] - latitude[None, :])
+            q3 = np.cos(latitude[:, None] + latitude[None, :])
+            arc = np.arccos(np.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1, 1))
+            dist = np.trunc(6378.388 * arc + 1.0)
+            np.fill_diagonal(dist, 0.0)
+            return dist
+
+        raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE: {edge_weight_type}")
+
+    # Cache folder of an instance: depends on the name, size and
+    # modification time of the file, so an edited file is parsed again
+    # without reading it to check. When the file is missing (for example,
+    # not downloaded on a machine without network access) the newest
+    # complete cache entry of the instance is used.
+    def _cache_path(self, path):
+        path = Path(path)
+        if path.exists():
+            stat = path.stat()
+            return self.cache_dir / f"{path.stem}-{stat.st_size}-{stat.st_mtime_ns}"
+
+        entries = self._cache_entries(path)
+        if not entries:
+            raise FileNotFoundError(f"{path} not found and not in the cache")
+        return entries[-1]
+
+    # Complete cache entries of an instance, oldest first
+    def _cache_entries(self, path):
+        if self.cache_dir is None or not self.cache_dir.exists():
+            return []
+        pattern = re.compile(re.escape(Path(path).stem) + r"-\d+-\d+")
+        entries = [
+            entry
+            for entry in self.cache_dir.iterdir()
+            if pattern.fullmatch(entry.name) and (entry / "info.json").exists()
+        ]
+        return sorted(entries, key=lambda entry: entry.stat().st_mtime_ns)
+
+    # Whether the instance can be loaded from the cache without its file
+    def is_cached(self, path):
+        return bool(self._cache_entries(path))
+
+    # Write to a temporary file first, so an interrupted run
+    # never leaves a partial file in the cache
+    def _save_array(self, file, array):
+        temporary_file = file.with_name(file.name + ".tmp")
+        with open(temporary_file, "wb") as output:
+            np.save(output, array)
+        temporary_file.replace(file)
+
+    def _load_array(self, file):
+        return np.load(file, mmap_mode="r") if file.exists() else None
+
+    # parse() results, read from the cache when available
+    def _load_parsed(self, path, cache_path):
+        if cache_path is None:
+            return self.parse(path)
+
+        # info.json is written last, it marks a complete cache entry
+        info_file = cache_path / "info.json"
+        if info_file.exists():
+            header = json.loads(info_file.read_text(encoding="utf-8"))
+            labels = self._load_array(cache_path / "labels.npy")
+            coordinates = self._load_array(cache_path / "coordinates.npy")
+            weights = self._load_array(cache_path / "weights.npy")
+            return header, labels, coordinates, weights
+
+        header, labels, coordinates, weights = self.parse(path)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        self._save_array(cache_path / "labels.npy", labels)
+        if coordinates is not None:
+            self._save_array(cache_path / "coordinates.npy", coordinates)
+        if weights is not None:
+            self._save_array(cache_path / "weights.npy", weights)
+        info_file.write_text(json.dumps(header), encoding="utf-8")
+
+        return header, labels, coordinates, weights
+
+    # Load an instance as a TSPInstance. The distance matrix is
+    # memory-mapped from the cache when the file was already loaded.
+    def load(self, path, rounded=True):
+        cache_path = self._cache_path(path) if self.cache_dir is not None else None
+        header, labels, coordinates, weights = self._load_parsed(path, cache_path)
+
+        if header.get("EDGE_WEIGHT_TYPE") == "EXPLICIT":
+            distances = weights
+        elif cache_path is None:
+            distances = self.distance_matrix(header, coordinates, weights, rounded)
+        else:
+            suffix = "rounded" if rounded else "real"
+            distances_file = cache_path / f"distances-{suffix}.npy"
+            distances = self._load_array(distances_file)
+            if distances is None:
+                distances = self.distance_matrix(
+                    header, coordinates, weights, rounded
+                )
+                self._save_array(distances_file, distances)
+
+        return TSPInstance(distances, labels=labels.tolist(), coordinates=coordinates)
+
+    # Only the coordinates, as the DataFrame used by TSPFunctions
+    # (index: city labels, columns: X, Y)
+    def load_coordinates(self, path):
+        cache_path = self._cache_path(path) if self.cache_dir is not None else None
+        _, labels, coordinates, _ = self._load_parsed(path, cache_path)
+        if coordinates is None:
+            raise ValueError(f"{path} has no city coordinates")
+
+        df_coordinates = pd.DataFrame(
+            np.asarray(coordinates), columns=["X", "Y"], index=np.asarray(labels)
+        )
+        return df_coordinates
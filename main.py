@@ -1,37 +1,55 @@
 import pandas as pd
 
-from helpers.coordinates import df_coordinates
+from helpers.coordinates import load_tsp_instance
 from helpers.tsp_functions import TSPFunctions
 from helpers.rastrigin_functions import RastriginFunctions
+from helpers.benchmark_functions import BENCHMARK_FUNCTIONS
 from helpers.plot_functions import PlotFunctions
 from helpers.report_functions import ReportFunctions
 from algorithms.hill_climbing import HillClimbing
 from algorithms.simulated_annealing import SimulatedAnnealing
 from algorithms.genetic_algorithm import GeneticAlgorithm
+from algorithms.local_search import LocalSearch
 
 
 class Main:
     def __init__(self):
         self.tsp_functions = TSPFunctions()
-        self.rastrigin_functions = RastriginFunctions()
+        # Rastrigin problem of run_rastrigin (any number of dimensions)
+        self.rastrigin_functions = RastriginFunctions(dimensions=2)
         self.plot_functions = PlotFunctions()
         self.report_functions = ReportFunctions()
         self.hill_climbing = HillClimbing()
         self.simulated_annealing = SimulatedAnnealing()
         self.genetic_algorithm = GeneticAlgorithm()
-        self.tsp = self.tsp_functions.generate_tsp_problem(df_coordinates)
+        self.local_search = LocalSearch()
         # number of times each algorithm will be executed
         self.n_times = 10
         # iterations will be limited by objective functions calls
         self.max_objective_calls_tsp = 50000
         self.max_objective_calls_rastrigin = 1000
+        # worker processes for the executions (None: all cores)
+        self.n_jobs = 1
+        # seed of the executions (None: different results on every run)
+        self.seed = None
+
+    # TSP instance, loaded on first use from the local TSPLIB copy
+    # (the file is downloaded only on the first run)
+    @property
+    def tsp(self):
+        return load_tsp_instance()
 
     def run_tsp(self):
         algorithms = {
             "Hill-Climbing": self.hill_climbing.tsp_hill_climbing,
             "Hill-Climbing Restart": self.hill_climbing.tsp_hill_climbing_restart,
             "Simulated Annealing": self.simulated_annealing.tsp_simulated_annealing_linear_cooling,
+            "Simulated Annealing (adaptive)": self.simulated_annealing.tsp_simulated_annealing,
+            "Simulated Annealing (batch)": self.simulated_annealing.tsp_simulated_annealing_batch,
             "Genetic Algorithm": self.genetic_algorithm.tsp_genetic_algorithm,
+            "2-opt": self.local_search.tsp_two_opt,
+            "2-opt + Or-opt": self.local_search.tsp_local_search,
+            "Lin-Kernighan": self.local_search.tsp_lin_kernighan,
         }
         # Execute N times to generate cost variable statistics
         df_cost = self.report_functions.execute_n_times_tsp(
@@ -41,8 +59,11 @@ class Main:
             self.max_objective_calls_tsp,
             print_costs=True,
             print_routes=True,
+            n_jobs=self.n_jobs,
+            seed=self.seed,
         )
         # Summary of Results
+        print("Seed:", self.report_functions.last_seed)
         pd.options.display.float_format = "{:,.2f}".format
         print(df_cost.T.describe())
         df_cost.to_json(
@@ -51,11 +72,24 @@ class Main:
         # Boxplot
         self.plot_functions.boxplot_sorted(df_cost)
 
-    def run_rastrigin(self):
+    # problem: continuous problem (see BENCHMARK_FUNCTIONS), by default
+    # self.rastrigin_functions; problem_name: prefix of the graph files
+    def run_rastrigin(self, problem=None, problem_name=None):
+        problem = problem or self.rastrigin_functions
+        # all the algorithms solve the same problem
+        for algorithm_class in (
+            self.hill_climbing,
+            self.simulated_annealing,
+            self.genetic_algorithm,
+        ):
+            algorithm_class.rastrigin_functions = problem
+
         algorithms = {
             "Hill-Climbing": self.hill_climbing.rastrigin_hill_climbing,
             "Hill-Climbing Restart": self.hill_climbing.rastrigin_hill_climbing_restart,
             "Simulated Annealing": self.simulated_annealing.rastrigin_simulated_annealing_linear_cooling,
+            "Simulated Annealing (adaptive)": self.simulated_annealing.rastrigin_simulated_annealing,
+            "Simulated Annealing (batch)": self.simulated_annealing.rastrigin_simulated_annealing_batch,
             "Genetic Algorithm": self.genetic_algorithm.rastrigin_genetic_algorithm,
         }
         df_cost = self.report_functions.execute_n_times_rastrigin(
@@ -63,12 +97,27 @@ class Main:
             self.n_times,
             self.max_objective_calls_rastrigin,
             print_costs=True,
+            n_jobs=self.n_jobs,
+            seed=self.seed,
+            problem_name=problem_name,
         )
         # Summary of Results
+        print("Seed:", self.report_functions.last_seed)
         pd.options.display.float_format = "{:,.2f}".format
         print(df_cost.T.describe())
         # Boxplot
         self.plot_functions.boxplot_sorted(df_cost)
+        return df_cost
+
+    # The Rastrigin experiment on every benchmark function, with the
+    # dimensions of self.rastrigin_functions
+    def run_benchmarks(self):
+        results = {}
+        for name, problem_class in BENCHMARK_FUNCTIONS.items():
+            print(name)
+            problem = problem_class(self.rastrigin_functions.dimensions)
+            results[name] = self.run_rastrigin(problem, problem_name=name)
+        return results
 
 
 if __name__ == "__main__":
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from algorithms.genetic_algorithm import GeneticAlgorithm
+from algorithms.hill_climbing import HillClimbing
+from algorithms.local_search import LocalSearch
+from algorithms.simulated_annealing import SimulatedAnnealing
+from helpers.budget import Budget
+from helpers.tsp_functions import TSPFunctions
+
+
+# Random instance of 30 cities
+@pytest.fixture(name="tsp", scope="module")
+def tsp_fixture():
+    rng = np.random.default_rng(0)
+    coordinates = pd.DataFrame(rng.random((30, 2)) * 1000, columns=["X", "Y"])
+    return TSPFunctions().generate_tsp_problem(coordinates)
+
+
+def tsp_algorithms():
+    hill_climbing = HillClimbing()
+    genetic_algorithm = GeneticAlgorithm()
+    island_model = GeneticAlgorithm()
+    island_model.islands = 2
+    simulated_annealing = SimulatedAnnealing()
+    local_search = LocalSearch()
+    return {
+        "hill climbing": hill_climbing.tsp_hill_climbing,
+        "hill climbing restart": hill_climbing.tsp_hill_climbing_restart,
+        "genetic algorithm": genetic_algorithm.tsp_genetic_algorithm,
+        "island model": island_model.tsp_genetic_algorithm,
+        "simulated annealing": simulated_annealing.tsp_simulated_annealing,
+        "batched annealing": simulated_annealing.tsp_simulated_annealing_batch,
+        "local search": local_search.tsp_local_search,
+    }
+
+
+def rastrigin_algorithms():
+    hill_climbing = HillClimbing()
+    genetic_algorithm = GeneticAlgorithm()
+    simulated_annealing = SimulatedAnnealing()
+    return {
+        "hill climbing": hill_climbing.rastrigin_hill_climbing,
+        "hill climbing restart": hill_climbing.rastrigin_hill_climbing_restart,
+        "genetic algorithm": genetic_algorithm.rastrigin_genetic_algorithm,
+        "simulated annealing": simulated_annealing.rastrigin_simulated_annealing,
+    }
+
+
+# The initial solution is always evaluated: a cap of 0 still makes one call
+@pytest.mark.parametrize("cap", [0, 1, 7, 150])
+@pytest.mark.parametrize("name", tsp_algorithms().keys())
+def test_tsp_tiny_cap(tsp, name, cap):
+    budget = Budget(cap)
+    cost, solution, *_ = tsp_algorithms()[name](tsp, budget, rng=1)
+
+    assert budget.objective_calls <= max(cap, 1)
+    assert sorted(solution) == list(range(tsp.n_cities))
+    assert cost == pytest.approx(TSPFunctions().calculate_cost(tsp, solution))
+
+
+@pytest.mark.parametrize("cap", [0, 1, 7, 150])
+@pytest.mark.parametrize("name", rastrigin_algorithms().keys())
+def test_rastrigin_tiny_cap(name, cap):
+    budget = Budget(cap)
+    cost, *_ = rastrigin_algorithms()[name](budget, rng=1)
+
+    assert budget.objective_calls <= max(cap, 1)
+    assert np.isfinite(cost)
+
+
+@pytest.mark.parametrize("name", tsp_algorithms().keys())
+def test_tsp_deadline(tsp, name):
+    budget = Budget(time_limit=0.05)
+    tsp_algorithms()[name](tsp, budget, rng=1)
+
+    assert budget.elapsed() < 0.5
+
+
+# The calls of the child budgets of the workers add up to the calls of the run
+def test_worker_budget_stats(tsp):
+    hill_climbing = HillClimbing()
+    budget = Budget(5000)
+    hill_climbing.tsp_hill_climbing_restart(tsp, budget, rng=1)
+    calls = [stats["objective_calls"] for stats in hill_climbing.restart_budget_stats]
+    assert sum(calls) == budget.objective_calls
+
+    island_model = GeneticAlgorithm()
+    island_model.islands = 2
+    island_model.island_jobs = 1
+    budget = Budget(5000)
+    island_model.tsp_genetic_algorithm(tsp, budget, rng=1)
+    calls = [stats["objective_calls"] for stats in island_model.island_budget_stats]
+    initial_calls = island_model.islands * island_model.population_size_tsp
+    assert sum(calls) + initial_calls == budget.objective_calls
+
+
+# With 4 cities every tour is soon in the fitness cache: the generations
+# use no calls and the run stops anyway
+def test_cached_generations_stop():
+    coordinates = pd.DataFrame([[0, 0], [0, 1], [1, 1], [1, 0]], columns=["X", "Y"])
+    tsp = TSPFunctions().generate_tsp_problem(coordinates)
+    genetic_algorithm = GeneticAlgorithm()
+    genetic_algorithm.population_size_tsp = 20
+    genetic_algorithm.fitness_cache_size = 100
+    budget = Budget(10**6)
+    cost, *_ = genetic_algorithm.tsp_genetic_algorithm(tsp, budget, rng=1)
+
+    assert cost == pytest.approx(4)
+    assert budget.objective_calls <= 20 + 3
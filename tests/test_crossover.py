@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from helpers.tsp_crossover import OrderCrossover, PartiallyMappedCrossover
+
+
+# Order crossover of one pair with a list: the segment of the first
+# parent, then the other cities in the order of the second parent,
+# placed from the position after the segment
+def naive_order_child(first, second, start, end):
+    size = len(first)
+    child = [None] * size
+    child[start : end + 1] = first[start : end + 1]
+    remaining = [city for city in second if city not in child]
+    for offset, city in enumerate(remaining):
+        child[(end + 1 + offset) % size] = city
+    return child
+
+
+# Partially mapped crossover of one pair with a list: the segment of the
+# first parent, the other cities of the second one mapped out of the
+# segment
+def naive_mapped_child(first, second, start, end):
+    child = list(second)
+    child[start : end + 1] = first[start : end + 1]
+    segment = first[start : end + 1]
+    for i in list(range(start)) + list(range(end + 1, len(first))):
+        city = second[i]
+        while city in segment:
+            city = second[first.index(city)]
+        child[i] = city
+    return child
+
+
+@pytest.mark.parametrize(
+    "operator, naive_child",
+    [
+        (OrderCrossover(), naive_order_child),
+        (PartiallyMappedCrossover(), naive_mapped_child),
+    ],
+)
+@pytest.mark.parametrize("size", [2, 3, 10, 31])
+def test_crossover(operator, naive_child, size):
+    rng = np.random.default_rng(size)
+    count = 200
+    parents_1 = np.array([rng.permutation(size) for _ in range(count)])
+    parents_2 = np.array([rng.permutation(size) for _ in range(count)])
+
+    # the same cut points as the operator, from the same random stream
+    start, end = operator.cut_points(count, size, np.random.default_rng(7))
+    children_1, children_2 = operator.crossover(
+        parents_1, parents_2, np.random.default_rng(7)
+    )
+
+    for k in range(count):
+        first, second = parents_1[k].tolist(), parents_2[k].tolist()
+        assert children_1[k].tolist() == naive_child(first, second, start[k], end[k])
+        assert children_2[k].tolist() == naive_child(second, first, start[k], end[k])
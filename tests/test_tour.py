@@ -0,0 +1,148 @@
+import numpy as np
+import pytest
+
+from helpers.tour import ArrayTour, TwoLevelTour
+
+
+# a small segment size, so that the reversals split the segments and
+# rebuild them
+TOURS = [ArrayTour, lambda cities: TwoLevelTour(cities, segment_size=3)]
+
+
+# Reverse the path from a to c (going forward) of a list, in place
+def naive_reverse(route, city_a, city_c):
+    size = len(route)
+    i = route.index(city_a)
+    length = (route.index(city_c) - i) % size + 1
+    path = [route[(i + step) % size] for step in range(length)]
+    for step, city in enumerate(reversed(path)):
+        route[(i + step) % size] = city
+
+
+# Edges of a route, without direction
+def edges(route):
+    return {frozenset(edge) for edge in zip(route, route[1:] + route[:1])}
+
+
+def naive_between(route, city_a, city_b, city_c):
+    size = len(route)
+    i = route.index(city_a)
+    return (route.index(city_b) - i) % size <= (route.index(city_c) - i) % size
+
+
+# next and prev of every city, read from the positions
+def assert_consistent(tour):
+    route = tour.to_list()
+    assert sorted(route) == list(range(len(route)))
+    for i, city in enumerate(route):
+        assert tour.next(city) == route[(i + 1) % len(route)]
+        assert tour.prev(city) == route[i - 1]
+        assert tour[i] == city
+
+
+@pytest.mark.parametrize("make_tour", TOURS)
+@pytest.mark.parametrize("size", [5, 40])
+def test_reverse(make_tour, size):
+    rng = np.random.default_rng(size)
+    route = rng.permutation(size).tolist()
+    tour = make_tour(route)
+
+    for _ in range(300):
+        city_a, city_c = rng.choice(size, 2).tolist()
+        naive_reverse(route, city_a, city_c)
+        tour.reverse(city_a, city_c)
+        assert_consistent(tour)
+        # the tour may reverse the rest of the route instead: same cycle
+        assert edges(tour.to_list()) == edges(route)
+
+        # the reference follows the direction of the tour
+        if tour.next(route[0]) != route[1 % size]:
+            route.reverse()
+
+
+@pytest.mark.parametrize("make_tour", TOURS)
+def test_between(make_tour):
+    rng = np.random.default_rng(1)
+    size = 20
+    tour = make_tour(rng.permutation(size))
+    for _ in range(20):
+        tour.reverse(*rng.choice(size, 2).tolist())
+    route = tour.to_list()
+    for city_a, city_b, city_c in rng.choice(size, (300, 3)).tolist():
+        assert tour.between(city_a, city_b, city_c) == naive_between(
+            route, city_a, city_b, city_c
+        )
+
+
+@pytest.mark.parametrize("make_tour", TOURS)
+def test_two_opt_move(make_tour):
+    rng = np.random.default_rng(2)
+    size = 30
+    tour = make_tour(rng.permutation(size))
+    for _ in range(200):
+        route = tour.to_list()
+        i, j = sorted(rng.choice(size, 2, replace=False).tolist())
+        city_a, city_b = route[i], route[i + 1]
+        city_c, city_d = route[j], route[(j + 1) % size]
+        # read the other way half of the times
+        if rng.random() < 0.5:
+            city_a, city_b, city_c, city_d = city_b, city_a, city_d, city_c
+
+        expected = edges(route) - edges([city_a, city_b]) - edges([city_c, city_d])
+        tour.two_opt_move(city_a, city_b, city_c, city_d)
+        assert_consistent(tour)
+        if city_b != city_c and city_a != city_d:
+            expected |= edges([city_a, city_c]) | edges([city_b, city_d])
+            assert edges(tour.to_list()) == expected
+
+
+@pytest.mark.parametrize("make_tour", TOURS)
+def test_or_opt_move(make_tour):
+    rng = np.random.default_rng(3)
+    size = 30
+    tour = make_tour(rng.permutation(size))
+    for _ in range(200):
+        route = tour.to_list()
+        # segment of 1 to 3 cities at positions start ... end, moved
+        # between the cities at positions c and c + 1, outside of it
+        start = int(rng.integers(size))
+        end = start + int(rng.integers(3))
+        position_c = end + 1 + int(rng.integers(size - end + start - 2))
+        previous, first = route[start - 1], route[start % size]
+        last, following = route[end % size], route[(end + 1) % size]
+        city_c, city_d = route[position_c % size], route[(position_c + 1) % size]
+        if rng.random() < 0.5:
+            previous, first, last, following = following, last, first, previous
+            city_c, city_d = city_d, city_c
+
+        expected = edges(route) - edges([previous, first]) - edges([last, following])
+        expected -= edges([city_c, city_d])
+        expected |= edges([previous, following])
+        expected |= edges([city_c, first]) | edges([last, city_d])
+        tour.or_opt_move((previous, first, last, following), city_c, city_d)
+        assert_consistent(tour)
+        assert edges(tour.to_list()) == expected
+
+
+@pytest.mark.parametrize("make_tour", TOURS)
+def test_swap_cities(make_tour):
+    rng = np.random.default_rng(4)
+    size = 12
+    tour = make_tour(rng.permutation(size))
+    for _ in range(200):
+        route = tour.to_list()
+        city_a, city_b = rng.choice(size, 2).tolist()
+        i, j = route.index(city_a), route.index(city_b)
+        route[i], route[j] = city_b, city_a
+        tour.swap_cities(city_a, city_b)
+        assert_consistent(tour)
+        assert edges(tour.to_list()) == edges(route)
+
+
+@pytest.mark.parametrize("make_tour", TOURS)
+def test_array(make_tour):
+    tour = make_tour([2, 0, 3, 1])
+    assert np.asarray(tour).tolist() == [2, 0, 3, 1]
+    assert np.array(tour, dtype=float).dtype == float
+    with pytest.raises(ValueError):
+        np.array(tour, copy=False)
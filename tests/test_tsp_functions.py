@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.tsp_functions import TSPFunctions
+
+tsp_functions = TSPFunctions()
+
+
+# Random instance of 12 cities
+@pytest.fixture(name="tsp")
+def tsp_fixture():
+    rng = np.random.default_rng(0)
+    coordinates = pd.DataFrame(rng.random((12, 2)) * 1000, columns=["X", "Y"])
+    return tsp_functions.generate_tsp_problem(coordinates)
+
+
+@pytest.fixture(name="route")
+def route_fixture(tsp):
+    return tsp_functions.random_solution(tsp, rng=1)
+
+
+# Cost change of a move measured on a changed copy of the route
+def naive_delta(tsp, route, move):
+    changed = list(route)
+    tsp_functions.apply_move(changed, move)
+    return tsp_functions.calculate_cost(tsp, changed) - tsp_functions.calculate_cost(
+        tsp, route
+    )
+
+
+def or_opt_moves(n, max_length=3):
+    for length in range(1, max_length + 1):
+        for i in range(n - length + 1):
+            # any position outside the segment, except the city right before it
+            for offset in range(n - length - 1):
+                j = (i + length + offset) % n
+                for reverse in (False, True):
+                    yield ("or-opt", i, length, j, reverse)
+
+
+def test_swap_and_two_opt_deltas(tsp, route):
+    n = len(route)
+    for move_type in ("swap", "2-opt"):
+        for i in range(n):
+            for j in range(n):
+                if i == j:
+                    continue
+                move = (move_type, i, j)
+                assert tsp_functions.move_delta(tsp, route, move) == pytest.approx(
+                    naive_delta(tsp, route, move)
+                )
+
+
+def test_or_opt_deltas(tsp, route):
+    for move in or_opt_moves(len(route)):
+        assert tsp_functions.move_delta(tsp, route, move) == pytest.approx(
+            naive_delta(tsp, route, move)
+        )
+
+        changed = list(route)
+        tsp_functions.apply_move(changed, move)
+        assert sorted(changed) == sorted(route)
+
+
+def test_random_moves_are_valid(route):
+    n = len(route)
+    for move_type in ("swap", "2-opt", "or-opt"):
+        for move in tsp_functions.random_moves(n, 500, move_type, rng=2):
+            changed = list(route)
+            tsp_functions.apply_move(changed, move)
+            assert sorted(changed) == sorted(route)
+
+
+@pytest.mark.parametrize("neighborhood", ["swap", "2-opt"])
+def test_neighborhood_deltas(tsp, route, neighborhood):
+    n = len(route)
+    deltas = tsp_functions.neighborhood_deltas(tsp, route, neighborhood)
+
+    for i in range(n):
+        for j in range(n):
+            if 1 <= i < j:
+                expected = naive_delta(tsp, route, (neighborhood, i, j))
+                assert deltas[i, j] == pytest.approx(expected)
+            else:
+                assert deltas[i, j] == np.inf
+
+
+@pytest.mark.parametrize("max_moves", [None, 1, 7, 30])
+def test_best_neighbor(tsp, route, max_moves):
+    n = len(route)
+    moves = [("swap", i, j) for i in range(1, n) for j in range(i + 1, n)]
+    if max_moves is not None:
+        moves = moves[:max_moves]
+    costs = [
+        tsp_functions.calculate_cost(tsp, route) + naive_delta(tsp, route, move)
+        for move in moves
+    ]
+
+    neighbor, cost, _ = tsp_functions.get_best_neighbor(
+        tsp, route, "swap", max_moves
+    )
+
+    expected = min([*costs, tsp_functions.calculate_cost(tsp, route)])
+    assert cost == pytest.approx(expected)
+    assert tsp_functions.calculate_cost(tsp, neighbor) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("rounded", [False, True])
+def test_distance_matrix(rounded):
+    rng = np.random.default_rng(4)
+    points = rng.random((300, 2)) * 1000
+    naive = np.hypot(*(points[:, None, :] - points[None, :, :]).transpose(2, 0, 1))
+    if rounded:
+        naive = np.floor(naive + 0.5)
+
+    dense = tsp_functions.generate_distance_matrix(points, rounded, block_size=64)
+    condensed = tsp_functions.generate_distance_matrix(
+        points, rounded, condensed=True, block_size=64
+    )
+
+    np.testing.assert_allclose(dense, naive)
+    rows, cols = np.triu_indices(len(points), 1)
+    np.testing.assert_allclose(condensed[rows, cols], naive[rows, cols], rtol=1e-6)
+    np.testing.assert_allclose(condensed[cols, rows], naive[rows, cols], rtol=1e-6)
@@ -0,0 +1,150 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+from helpers.tsplib import TSPLibLoader
+
+
+# Values of a symmetric matrix in the order of each EDGE_WEIGHT_FORMAT
+# of the TSPLIB documentation
+def explicit_values(weights, weight_format):
+    n = len(weights)
+    orders = {
+        "FULL_MATRIX": [(i, j) for i in range(n) for j in range(n)],
+        "UPPER_ROW": [(i, j) for i in range(n) for j in range(i + 1, n)],
+        "LOWER_ROW": [(i, j) for i in range(n) for j in range(i)],
+        "UPPER_DIAG_ROW": [(i, j) for i in range(n) for j in range(i, n)],
+        "LOWER_DIAG_ROW": [(i, j) for i in range(n) for j in range(i + 1)],
+        "UPPER_COL": [(i, j) for j in range(n) for i in range(j)],
+        "LOWER_COL": [(i, j) for j in range(n) for i in range(j + 1, n)],
+        "UPPER_DIAG_COL": [(i, j) for j in range(n) for i in range(j + 1)],
+        "LOWER_DIAG_COL": [(i, j) for j in range(n) for i in range(j, n)],
+    }
+    return [weights[i][j] for i, j in orders[weight_format]]
+
+
+def write_instance(path, header, section, values, per_line=7):
+    lines = [f"{key}: {value}" for key, value in header.items()]
+    lines.append(section)
+    # the values of a section can be split over the lines in any way
+    for start in range(0, len(values), per_line):
+        lines.append(" ".join(str(value) for value in values[start : start + per_line]))
+    lines.append("EOF")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def write_coordinates(path, coordinates, edge_weight_type):
+    header = {
+        "NAME": path.stem,
+        "TYPE": "TSP",
+        "DIMENSION": len(coordinates),
+        "EDGE_WEIGHT_TYPE": edge_weight_type,
+    }
+    lines = [f"{key}: {value}" for key, value in header.items()]
+    lines.append("NODE_COORD_SECTION")
+    for label, (x, y) in enumerate(coordinates, start=1):
+        lines.append(f"{label} {x} {y}")
+    lines.append("EOF")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+@pytest.mark.parametrize(
+    "weight_format",
+    [
+        "FULL_MATRIX",
+        "UPPER_ROW",
+        "LOWER_ROW",
+        "UPPER_DIAG_ROW",
+        "LOWER_DIAG_ROW",
+        "UPPER_COL",
+        "LOWER_COL",
+        "UPPER_DIAG_COL",
+        "LOWER_DIAG_COL",
+    ],
+)
+def test_explicit_formats(tmp_path, weight_format):
+    rng = np.random.default_rng(0)
+    weights = rng.integers(1, 1000, (9, 9))
+    weights = np.triu(weights, 1) + np.triu(weights, 1).T
+
+    path = tmp_path / "explicit.tsp"
+    header = {
+        "NAME": "explicit",
+        "TYPE": "TSP",
+        "DIMENSION": len(weights),
+        "EDGE_WEIGHT_TYPE": "EXPLICIT",
+        "EDGE_WEIGHT_FORMAT": weight_format,
+    }
+    write_instance(
+        path, header, "EDGE_WEIGHT_SECTION", explicit_values(weights, weight_format)
+    )
+
+    tsp = TSPLibLoader(cache_dir=None).load(path)
+    np.testing.assert_array_equal(tsp.distances, weights)
+
+
+def att_distance(a, b):
+    r = math.sqrt(((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2) / 10.0)
+    t = int(r + 0.5)
+    return t + 1 if t < r else t
+
+
+def geo_distance(a, b):
+    def radians(value):
+        degrees = int(value)
+        return math.pi * (degrees + 5.0 * (value - degrees) / 3.0) / 180.0
+
+    latitude_a, longitude_a = radians(a[0]), radians(a[1])
+    latitude_b, longitude_b = radians(b[0]), radians(b[1])
+    q1 = math.cos(longitude_a - longitude_b)
+    q2 = math.cos(latitude_a - latitude_b)
+    q3 = math.cos(latitude_a + latitude_b)
+    return int(6378.388 * math.acos(0.5 * ((1 + q1) * q2 - (1 - q1) * q3)) + 1.0)
+
+
+@pytest.mark.parametrize(
+    "edge_weight_type, distance",
+    [
+        ("EUC_2D", lambda a, b: int(math.dist(a, b) + 0.5)),
+        ("CEIL_2D", lambda a, b: math.ceil(math.dist(a, b))),
+        ("ATT", att_distance),
+        ("GEO", geo_distance),
+    ],
+)
+def test_coordinate_distances(tmp_path, edge_weight_type, distance):
+    rng = np.random.default_rng(1)
+    coordinates = np.round(rng.uniform(-80, 80, (10, 2)), 2)
+    path = tmp_path / "cities.tsp"
+    write_coordinates(path, coordinates, edge_weight_type)
+
+    tsp = TSPLibLoader(cache_dir=None).load(path)
+
+    for i, a in enumerate(coordinates):
+        for j, b in enumerate(coordinates):
+            expected = 0 if i == j else distance(a, b)
+            assert tsp.distances[i, j] == pytest.approx(expected)
+
+
+def test_cache_without_the_file(tmp_path):
+    path = tmp_path / "cities.tsp"
+    write_coordinates(path, np.arange(20.0).reshape(10, 2) ** 1.5, "EUC_2D")
+    loader = TSPLibLoader(cache_dir=tmp_path / "cache")
+
+    tsp = loader.load(path)
+    assert loader.is_cached(path)
+
+    # an edited file gets a new entry
+    write_coordinates(path, np.arange(20.0).reshape(10, 2) ** 2, "EUC_2D")
+    os.utime(path, ns=(1, 1))
+    edited = loader.load(path)
+    assert not np.array_equal(edited.distances, tsp.distances)
+
+    # without the file, the newest entry is used
+    path.unlink()
+    cached = loader.load(path)
+    np.testing.assert_array_equal(cached.distances, edited.distances)
+
+    with pytest.raises(FileNotFoundError):
+        loader.load(tmp_path / "other.tsp")